@@ -1,9 +1,156 @@
 # Import necessary libraries
-import pandas as pd
-import pymongo
-import mysql.connector
-import matplotlib.pyplot as plt
-import streamlit as st
+import argparse
+import hashlib
+import importlib
+import io
+import os
+import re
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Heavy libraries are imported on first use, so that each stage only pays for the modules it needs
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Import the module the first time one of its attributes is used
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+pymongo = LazyModule('pymongo')
+mysql = types.SimpleNamespace(connector=LazyModule('mysql.connector'))
+plt = LazyModule('matplotlib.pyplot')
+st = LazyModule('streamlit')
+pa = LazyModule('pyarrow')
+
+
+# Number of rendered charts kept in memory; the least recently used chart is evicted first
+CHART_CACHE_SIZE = 64
+
+
+# Rendered charts keyed by a hash of the data they are drawn from and the chart options
+class ChartCache:
+    def __init__(self, size=CHART_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._charts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        # Rendering also happens under the lock, as pyplot keeps global state
+        with self._lock:
+            if key in self._charts:
+                self.hits += 1
+                self._charts.move_to_end(key)
+                return self._charts[key]
+            self.misses += 1
+            chart = render()
+            self._charts[key] = chart
+            if len(self._charts) > self.size:
+                self._charts.popitem(last=False)
+            return chart
+
+
+# Define a function to hash the data of a chart together with its options
+def chart_key(df, **options):
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    digest.update(repr((list(df.columns), sorted(options.items()))).encode())
+    return digest.hexdigest()
+
+
+# Define a function to render a horizontal bar chart to PNG bytes, closing the figure afterwards
+def render_bar_chart(df, xlabel, color=None):
+    fig, ax = plt.subplots(figsize=(10, 5))
+    try:
+        df.plot(kind='barh', color=color, ax=ax)
+        ax.set_xlabel(xlabel)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+# Define a function to create the chart cache; wrapped in st.cache_resource so that it outlives Streamlit reruns
+def get_chart_cache():
+    return ChartCache()
+
+
+# Reporter that renders the pipeline output in the Streamlit app
+class StreamlitReporter:
+    draws_charts = True
+
+    def __init__(self):
+        self.charts = st.cache_resource(get_chart_cache)()
+
+    def title(self, text):
+        st.title(text)
+
+    def subheader(self, text):
+        st.subheader(text)
+
+    def dataframe(self, df):
+        st.dataframe(df)
+
+    def bar_chart(self, df, xlabel, color=None):
+        # Render the chart only when its data or options have changed since it was last drawn
+        key = chart_key(df, kind='barh', xlabel=xlabel, color=color)
+        st.image(self.charts.get(key, lambda: render_bar_chart(df, xlabel, color)))
+
+    def info(self, text):
+        st.info(text)
+
+    def warning(self, text):
+        st.warning(text)
+
+    def error(self, text):
+        st.error(text)
+
+
+# Reporter that writes the pipeline output to the console for headless and cron runs
+class ConsoleReporter:
+    draws_charts = False
+
+    def title(self, text):
+        print(f"\n{text}\n{'=' * len(text)}")
+
+    def subheader(self, text):
+        print(f"\n{text}\n{'-' * len(text)}")
+
+    def dataframe(self, df):
+        # Query results arrive as pyarrow Tables
+        if hasattr(df, 'to_pandas'):
+            df = df.to_pandas()
+        print(df.to_string())
+
+    def bar_chart(self, df, xlabel, color=None):
+        # Charts are printed as the table they are drawn from
+        print(df.to_string())
+
+    def info(self, text):
+        print(text)
+
+    def warning(self, text):
+        print(f"WARNING: {text}", file=sys.stderr)
+
+    def error(self, text):
+        print(f"ERROR: {text}", file=sys.stderr)
+
+
+# Reporter used by every stage; replaced in the main function according to --reporter
+reporter = ConsoleReporter()
 
 
 # Task 1: Rename Column Names
@@ -102,20 +249,137 @@ def handle_missing_data(df):
     compare.columns = ['Missing_data_before(%)','Missing_data_after(%)']
 
     # Plot the comparison of missing data percentages as a horizontal bar chart
-    st.title('Comparison of missing data before and after the data-filling process was done!')
-    
-    # Create a Figure object
-    fig, ax = plt.subplots(figsize=(10, 5))
-    compare.plot(kind='barh', color=['brown', 'skyblue'], ax=ax)
-    ax.set_xlabel('Percent(%)')
-
-    # Display the plot in Streamlit
-    st.pyplot(fig)    
+    reporter.title('Comparison of missing data before and after the data-filling process was done!')
+    reporter.bar_chart(compare, xlabel='Percent(%)', color=['brown', 'skyblue'])
 
     # Return the modified DataFrame with the handled missing data
     return df
 
 
+# Task 4a: Validate Data and Split Rejected Rows
+
+# Largest values that fit into the SMALLINT UNSIGNED District_code and INT UNSIGNED count columns of the schema
+MYSQL_SMALLINT_UNSIGNED_MAX = 2**16 - 1
+MYSQL_INT_UNSIGNED_MAX = 2**32 - 1
+
+# Totals that must equal the sum of their parts whenever all of them are present
+IDENTITY_CONSTRAINTS = {
+    'POPULATION_MISMATCH': ('Population', ['Male', 'Female']),
+    'LITERATE_MISMATCH': ('Literate', ['Literate_Male', 'Literate_Female']),
+    'WORKERS_MISMATCH': ('Workers', ['Male_Workers', 'Female_Workers']),
+    'HOUSEHOLDS_MISMATCH': ('Households', ['Households_Rural', 'Households_Urban'])
+}
+
+# Function to validate the cleaned data and split failed rows into a reject table with reason codes
+def validate_data(df, district_codes=None, state_ids=None):
+    # Numeric columns that are loaded into the MySQL tables
+    numeric_columns = ['District_code'] + [column for _, column in CENSUS_DATA_COLUMNS + HOUSEHOLD_DATA_COLUMNS]
+    values = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+    present = values.notna()
+
+    # Build one boolean mask per reason code, all computed column-wise over the whole DataFrame
+    checks = {}
+
+    # Type checks: values that are not numbers or not whole numbers
+    checks['INVALID_TYPE'] = ((df[numeric_columns].notna() & ~present) | (present & (values % 1 != 0))).any(axis=1)
+
+    # Range checks: values that do not fit into the SMALLINT UNSIGNED / INT UNSIGNED columns
+    checks['OUT_OF_RANGE'] = ((values.abs() > MYSQL_INT_UNSIGNED_MAX).any(axis=1)
+                              | (values['District_code'] > MYSQL_SMALLINT_UNSIGNED_MAX))
+
+    # Non-negativity: counts can never be negative
+    checks['NEGATIVE_VALUE'] = (values < 0).any(axis=1)
+
+    # Identity constraints: totals must match the sum of their parts
+    for reason, (total, parts) in IDENTITY_CONSTRAINTS.items():
+        complete = present[[total] + parts].all(axis=1)
+        checks[reason] = complete & (values[total] != values[parts].sum(axis=1))
+
+    # Key checks: every row needs a District_code, a District name and a State/UT, and keys must be unique.
+    # District names repeat across states (Hamirpur, Bilaspur, ...), so names only need to be unique per state.
+    checks['MISSING_DISTRICT_CODE'] = ~present['District_code']
+    checks['MISSING_DISTRICT'] = df['District'].isna()
+    checks['MISSING_STATE'] = df['State/UT'].isna()
+    checks['DUPLICATE_DISTRICT_CODE'] = present['District_code'] & values['District_code'].duplicated()
+    checks['DUPLICATE_DISTRICT'] = df['District'].notna() & df.duplicated(subset=['State/UT', 'District'])
+
+    # Foreign-key presence against the keys already loaded into MySQL, when they are given
+    if district_codes is not None:
+        checks['UNKNOWN_DISTRICT_CODE'] = present['District_code'] & ~values['District_code'].isin(district_codes)
+    if state_ids is not None:
+        checks['UNKNOWN_STATE_ID'] = df['State/UT'].notna() & ~df['State/UT'].isin(state_ids)
+
+    # Join the reason codes of every failed check into one string per row
+    checks = pd.DataFrame(checks, index=df.index)
+    failed = checks.any(axis=1)
+    reasons = checks.dot(checks.columns + ';').str.rstrip(';')
+
+    # Split the DataFrame into clean rows (with numeric columns coerced) and the reject table
+    clean = pd.concat([df.drop(columns=numeric_columns), values], axis=1)[df.columns].loc[~failed]
+    rejects = pd.concat([df.loc[failed], reasons[failed].rename('reject_reason')], axis=1)
+
+    return clean, rejects
+
+
+# Function to summarise the reject table instead of logging each failed row
+def report_rejects(rejects):
+    if rejects.empty:
+        return
+
+    # Count the rows per reason code
+    reason_counts = rejects['reject_reason'].str.split(';').explode().value_counts()
+
+    reporter.warning(f"{len(rejects)} rows failed validation and were not loaded.")
+    reporter.dataframe(reason_counts.rename_axis('reject_reason').reset_index(name='rows'))
+    reporter.dataframe(rejects[['District_code', 'District', 'State/UT', 'reject_reason']])
+
+
+# Task 4b: Derived Metrics
+
+# Catalogue of rates and shares as (numerator columns, denominator column, scale), each computed once as
+# SUM(numerator) / SUM(denominator) * scale. A missing count among several numerator columns counts as 0, as in
+# the MySQL load, but a metric whose numerator columns are all missing is NULL rather than a rate of 0, and a
+# zero denominator gives NULL like the SQL division. Adding an entry adds a column to both sinks.
+DERIVED_METRICS = {
+    'worker_percentage': (['Male_Workers', 'Female_Workers'], 'Population', 100),
+    'literacy_rate': (['Literate_Education'], 'Population', 100),
+    'percentage_married_couples': ([
+        'Married_couples_1_Households', 'Married_couples_2_Households', 'Married_couples_3_Households',
+        'Married_couples_3_or_more_Households', 'Married_couples_4_Households', 'Married_couples_5__Households'
+    ], 'Households', 100),
+    'internet_share': (['Households_with_Internet'], 'Households', 100),
+    'lpg_png_share': (['LPG_or_PNG_Households'], 'Households', 100),
+    'electric_lighting_share': (['Housholds_with_Electric_Lighting'], 'Households', 100),
+    'computer_share': (['Households_with_Computer'], 'Households', 100),
+    'latrine_within_premises_share': (['Having_latrine_facility_within_the_premises_Total_Households'], 'Households', 100),
+    'sex_ratio': (['Female'], 'Male', 1000)
+}
+
+# Function to compute the catalogue of metrics from a frame of counts, one row per district or state
+def compute_derived_metrics(totals, metrics=None):
+    metrics = metrics or DERIVED_METRICS
+    columns = {}
+    for name, (numerator, denominator, scale) in metrics.items():
+        denominators = totals[denominator].fillna(0)
+        numerators = totals[numerator].sum(axis=1, min_count=1)
+        columns[name] = numerators / denominators.where(denominators != 0) * scale
+    return pd.DataFrame(columns, index=totals.index)
+
+
+# Function to add the metrics of every district to the DataFrame as columns
+def add_derived_metrics(df, metrics=None):
+    metrics = metrics or DERIVED_METRICS
+    return pd.concat([df.drop(columns=list(metrics), errors='ignore'), compute_derived_metrics(df, metrics)], axis=1)
+
+
+# Function to compute the metrics of every state from the summed counts of its districts
+def compute_state_metrics(df, metrics=None):
+    metrics = metrics or DERIVED_METRICS
+    counts = sorted({column for numerator, denominator, _ in metrics.values() for column in numerator + [denominator]})
+    # Districts without a count add 0 to their state, as in the MySQL sums; a state without any stays NULL
+    return compute_derived_metrics(df[counts].groupby(df['State/UT']).sum(min_count=1), metrics)
+
+
 # Task 5: Save Data to MongoDB
 def save_to_mongodb(df):
     try:
@@ -128,19 +392,50 @@ def save_to_mongodb(df):
         # Access the 'census' collection within the 'census_db' database. If it doesn't exist, MongoDB will create it.
         collection = db["census"]
 
-        # Convert the DataFrame to a list of dictionaries (records) and insert them into the 'census' collection.
+        # Index the fields the MongoDB reports group and filter on
+        ensure_mongodb_indexes(collection)
+
+        # Convert the DataFrame to a list of dictionaries (records), storing missing values as null instead of NaN.
         # Each dictionary corresponds to a document in the MongoDB collection.
-        collection.insert_many(df.to_dict('records'))
+        records = df.astype(object).where(df.notna(), None).to_dict('records')
+
+        # Replace the document of each district, so that rerunning the pipeline never duplicates districts
+        collection.bulk_write([
+            pymongo.ReplaceOne({'District_code': record['District_code']}, record, upsert=True) for record in records
+        ])
     
     except Exception as e:
         # Handle exceptions that may occur during the connection or data insertion process
-        st.error(f"An error occurred while saving the data to MangoDB: {e}")
+        reporter.error(f"An error occurred while saving the data to MangoDB: {e}")
 
     finally:
         # Close the connection to the MongoDB server
         client.close()
 
 
+# Function to create the indexes of the 'census' collection
+def ensure_mongodb_indexes(collection):
+    # Collections written by earlier runs, which inserted every district again, cannot take a unique index
+    remove_duplicate_documents(collection)
+
+    # District_code identifies a district document; State/UT is the grouping key of the state reports
+    collection.create_index('District_code', unique=True)
+    collection.create_index('State/UT')
+
+
+# Function to remove all but one document of each district
+def remove_duplicate_documents(collection):
+    duplicates = collection.aggregate([
+        {'$group': {'_id': '$District_code', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}}
+    ])
+
+    # The document that is kept is replaced with the current data by the upsert that follows
+    extra_ids = [document_id for duplicate in duplicates for document_id in duplicate['ids'][1:]]
+    if extra_ids:
+        collection.delete_many({'_id': {'$in': extra_ids}})
+
+
 # Task 6: Database connection and data upload
 
 # Function to fetch data from MongoDB
@@ -163,7 +458,7 @@ def fetch_from_mongodb():
     
     except Exception as e:
         # Handle exceptions that may occur during the connection or data extraction process
-        st.error(f"An error occurred while extracting the data from MangoDB: {e}")
+        reporter.error(f"An error occurred while extracting the data from MangoDB: {e}")
     
     finally:
         # Close the connection to the MongoDB server
@@ -208,156 +503,182 @@ def create_mysql_tables():
             # SQL statements to create tables
             create_table_states = """
             CREATE TABLE IF NOT EXISTS States (
-                state_id INT AUTO_INCREMENT PRIMARY KEY,
+                state_id TINYINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
                 State_or_UT VARCHAR(255) UNIQUE NOT NULL
             )
             """
 
             create_table_districts = """
             CREATE TABLE IF NOT EXISTS Districts (
-                District_code INT PRIMARY KEY,
-                District VARCHAR(255) UNIQUE NOT NULL,
-                state_id INT,
+                District_code SMALLINT UNSIGNED PRIMARY KEY,
+                District VARCHAR(255) NOT NULL,
+                state_id TINYINT UNSIGNED NOT NULL,
+                UNIQUE KEY idx_districts_state (state_id, District),
                 FOREIGN KEY (state_id) REFERENCES States(state_id)
             )
             """
 
             create_table_census_data = """
             CREATE TABLE IF NOT EXISTS Census_Data (
-                census_id INT AUTO_INCREMENT PRIMARY KEY,
-                District_code INT,
-                Population BIGINT,
-                male BIGINT,
-                female BIGINT,
-                literate BIGINT,
-                Literate_Male BIGINT,
-                Literate_Female BIGINT,
-                sc BIGINT,
-		        Male_SC BIGINT,
-                Female_SC BIGINT,
-                st BIGINT,
-		        Male_ST BIGINT,
-                Female_ST BIGINT,
-                workers BIGINT,
-                male_workers BIGINT,
-                female_workers BIGINT,
-                main_workers BIGINT,
-                marginal_workers BIGINT,
-		        Non_Workers BIGINT,
-                Cultivator_Workers BIGINT,
-                Agricultural_Workers BIGINT,
-                household_workers BIGINT,
-                other_workers BIGINT,
-                hindus BIGINT,
-                muslims BIGINT,
-                christians BIGINT,
-                sikhs BIGINT,
-                buddhists BIGINT,
-                jains BIGINT,
-                others_religions BIGINT,
-                religion_not_stated BIGINT,
-                below_primary_education BIGINT,
-                primary_education BIGINT,
-                middle_education BIGINT,
-                secondary_education BIGINT,
-                higher_education BIGINT,
-                graduate_education BIGINT,
-                other_education BIGINT,
-                literate_education BIGINT,
-                illiterate_education BIGINT,
-                total_education BIGINT,
-                Young_and_Adult BIGINT,
-                Middle_Aged BIGINT,
-                Senior_Citizen BIGINT,
-                Age_Not_Stated BIGINT,
-                power_parity_less_than_rs_45000 BIGINT,
-                power_parity_rs_45000_90000 BIGINT,
-                power_parity_rs_90000_150000 BIGINT,
-                power_parity_rs_45000_150000 BIGINT,
-                power_parity_rs_150000_240000 BIGINT,
-                power_parity_rs_240000_330000 BIGINT,
-                power_parity_rs_150000_330000 BIGINT,
-                power_parity_rs_330000_425000 BIGINT,
-                power_parity_rs_425000_545000 BIGINT,
-                power_parity_rs_330000_545000 BIGINT,
-                power_parity_above_rs_545000 BIGINT,
-                total_power_parity BIGINT,
+                District_code SMALLINT UNSIGNED PRIMARY KEY,
+                Population INT UNSIGNED,
+                male INT UNSIGNED,
+                female INT UNSIGNED,
+                literate INT UNSIGNED,
+                Literate_Male INT UNSIGNED,
+                Literate_Female INT UNSIGNED,
+                sc INT UNSIGNED,
+		        Male_SC INT UNSIGNED,
+                Female_SC INT UNSIGNED,
+                st INT UNSIGNED,
+		        Male_ST INT UNSIGNED,
+                Female_ST INT UNSIGNED,
+                workers INT UNSIGNED,
+                male_workers INT UNSIGNED,
+                female_workers INT UNSIGNED,
+                main_workers INT UNSIGNED,
+                marginal_workers INT UNSIGNED,
+		        Non_Workers INT UNSIGNED,
+                Cultivator_Workers INT UNSIGNED,
+                Agricultural_Workers INT UNSIGNED,
+                household_workers INT UNSIGNED,
+                other_workers INT UNSIGNED,
+                hindus INT UNSIGNED,
+                muslims INT UNSIGNED,
+                christians INT UNSIGNED,
+                sikhs INT UNSIGNED,
+                buddhists INT UNSIGNED,
+                jains INT UNSIGNED,
+                others_religions INT UNSIGNED,
+                religion_not_stated INT UNSIGNED,
+                below_primary_education INT UNSIGNED,
+                primary_education INT UNSIGNED,
+                middle_education INT UNSIGNED,
+                secondary_education INT UNSIGNED,
+                higher_education INT UNSIGNED,
+                graduate_education INT UNSIGNED,
+                other_education INT UNSIGNED,
+                literate_education INT UNSIGNED,
+                illiterate_education INT UNSIGNED,
+                total_education INT UNSIGNED,
+                Young_and_Adult INT UNSIGNED,
+                Middle_Aged INT UNSIGNED,
+                Senior_Citizen INT UNSIGNED,
+                Age_Not_Stated INT UNSIGNED,
+                power_parity_less_than_rs_45000 INT UNSIGNED,
+                power_parity_rs_45000_90000 INT UNSIGNED,
+                power_parity_rs_90000_150000 INT UNSIGNED,
+                power_parity_rs_45000_150000 INT UNSIGNED,
+                power_parity_rs_150000_240000 INT UNSIGNED,
+                power_parity_rs_240000_330000 INT UNSIGNED,
+                power_parity_rs_150000_330000 INT UNSIGNED,
+                power_parity_rs_330000_425000 INT UNSIGNED,
+                power_parity_rs_425000_545000 INT UNSIGNED,
+                power_parity_rs_330000_545000 INT UNSIGNED,
+                power_parity_above_rs_545000 INT UNSIGNED,
+                total_power_parity INT UNSIGNED,
                 FOREIGN KEY (District_code) REFERENCES Districts(District_code)
             )
             """
 
             create_table_household_data = """
             CREATE TABLE IF NOT EXISTS Household_Data (
-                household_id INT AUTO_INCREMENT PRIMARY KEY,
-                District_code INT,
-		        LPG_or_PNG_Households BIGINT,
-                Housholds_with_Electric_Lighting BIGINT,
-                Households_with_Internet BIGINT,
-                Households_with_Computer BIGINT,
-                Households_Rural BIGINT,
-                Households_Urban BIGINT,
-                households BIGINT,
-                households_with_bicycle BIGINT,
-                households_with_car_jeep_van BIGINT,
-                households_with_radio_transistor BIGINT,
-                households_with_scooter_motorcycle_moped BIGINT,
-                households_with_telephone_mobile_phone_landline_only BIGINT,
-                households_with_telephone_mobile_phone_mobile_only BIGINT,
-                multi_amenities_households BIGINT,
-                households_with_television BIGINT,
-                households_with_telephone_mobile_phone BIGINT,
-                households_with_telephone_mobile_phone_both BIGINT,
-                condition_of_occupied_census_houses_dilapidated_households BIGINT,
-                households_with_separate_kitchen_cooking_inside_house BIGINT,
-                having_bathing_facility_total_households BIGINT,
-                having_latrine_facility_within_the_premises_total_households BIGINT,
-                ownership_owned_households BIGINT,
-                ownership_rented_households BIGINT,
-                type_of_bathing_facility_enclosure_without_roof_households BIGINT,
-                type_of_fuel_used_for_cooking_any_other_households BIGINT,
-                type_of_latrine_facility_pit_latrine_households BIGINT,
-                type_of_latrine_facility_other_latrine_households BIGINT,
-                latrine_nightsoil_open_drain_households BIGINT,
-                latrine_flush_connected_other_system_households BIGINT,
-                not_having_bathing_facility_within_the_premises_total_households BIGINT,
-                no_latrine_open_source_households BIGINT,
-                main_source_of_drinking_water_un_covered_well_households BIGINT,
-                drinking_water_handpump_tubewell_borewell_households BIGINT,
-                main_source_of_drinking_water_spring_households BIGINT,
-                main_source_of_drinking_water_river_canal_households BIGINT,
-                main_source_of_drinking_water_other_sources_households BIGINT,
-                drinking_water_other_sources_households BIGINT,
-                location_of_drinking_water_source_near_the_premises_households BIGINT,
-                location_of_drinking_water_source_within_the_premises_households BIGINT,
-                main_source_of_drinking_water_tank_pond_lake_households BIGINT,
-                main_source_of_drinking_water_tapwater_households BIGINT,
-                main_source_of_drinking_water_tubewell_borehole_households BIGINT,
-                household_size_1_person_households BIGINT,
-                household_size_2_persons_households BIGINT,
-                household_size_1_to_2_persons BIGINT,
-                household_size_3_persons_households BIGINT,
-                household_size_3_to_5_persons_households BIGINT,
-                household_size_4_persons_households BIGINT,
-                household_size_5_persons_households BIGINT,
-                household_size_6_8_persons_households BIGINT,
-                household_size_9_persons_and_above_households BIGINT,
-                location_of_drinking_water_source_away_households BIGINT,
-                married_couples_1_households BIGINT,
-                married_couples_2_households BIGINT,
-                married_couples_3_households BIGINT,
-                married_couples_3_or_more_households BIGINT,
-                married_couples_4_households BIGINT,
-                married_couples_5_households BIGINT,
-                married_couples_none_households BIGINT,
+                District_code SMALLINT UNSIGNED PRIMARY KEY,
+		        LPG_or_PNG_Households INT UNSIGNED,
+                Housholds_with_Electric_Lighting INT UNSIGNED,
+                Households_with_Internet INT UNSIGNED,
+                Households_with_Computer INT UNSIGNED,
+                Households_Rural INT UNSIGNED,
+                Households_Urban INT UNSIGNED,
+                households INT UNSIGNED,
+                households_with_bicycle INT UNSIGNED,
+                households_with_car_jeep_van INT UNSIGNED,
+                households_with_radio_transistor INT UNSIGNED,
+                households_with_scooter_motorcycle_moped INT UNSIGNED,
+                households_with_telephone_mobile_phone_landline_only INT UNSIGNED,
+                households_with_telephone_mobile_phone_mobile_only INT UNSIGNED,
+                multi_amenities_households INT UNSIGNED,
+                households_with_television INT UNSIGNED,
+                households_with_telephone_mobile_phone INT UNSIGNED,
+                households_with_telephone_mobile_phone_both INT UNSIGNED,
+                condition_of_occupied_census_houses_dilapidated_households INT UNSIGNED,
+                households_with_separate_kitchen_cooking_inside_house INT UNSIGNED,
+                having_bathing_facility_total_households INT UNSIGNED,
+                having_latrine_facility_within_the_premises_total_households INT UNSIGNED,
+                ownership_owned_households INT UNSIGNED,
+                ownership_rented_households INT UNSIGNED,
+                type_of_bathing_facility_enclosure_without_roof_households INT UNSIGNED,
+                type_of_fuel_used_for_cooking_any_other_households INT UNSIGNED,
+                type_of_latrine_facility_pit_latrine_households INT UNSIGNED,
+                type_of_latrine_facility_other_latrine_households INT UNSIGNED,
+                latrine_nightsoil_open_drain_households INT UNSIGNED,
+                latrine_flush_connected_other_system_households INT UNSIGNED,
+                not_having_bathing_facility_within_the_premises_total_households INT UNSIGNED,
+                no_latrine_open_source_households INT UNSIGNED,
+                main_source_of_drinking_water_un_covered_well_households INT UNSIGNED,
+                drinking_water_handpump_tubewell_borewell_households INT UNSIGNED,
+                main_source_of_drinking_water_spring_households INT UNSIGNED,
+                main_source_of_drinking_water_river_canal_households INT UNSIGNED,
+                main_source_of_drinking_water_other_sources_households INT UNSIGNED,
+                drinking_water_other_sources_households INT UNSIGNED,
+                location_of_drinking_water_source_near_the_premises_households INT UNSIGNED,
+                location_of_drinking_water_source_within_the_premises_households INT UNSIGNED,
+                main_source_of_drinking_water_tank_pond_lake_households INT UNSIGNED,
+                main_source_of_drinking_water_tapwater_households INT UNSIGNED,
+                main_source_of_drinking_water_tubewell_borehole_households INT UNSIGNED,
+                household_size_1_person_households INT UNSIGNED,
+                household_size_2_persons_households INT UNSIGNED,
+                household_size_1_to_2_persons INT UNSIGNED,
+                household_size_3_persons_households INT UNSIGNED,
+                household_size_3_to_5_persons_households INT UNSIGNED,
+                household_size_4_persons_households INT UNSIGNED,
+                household_size_5_persons_households INT UNSIGNED,
+                household_size_6_8_persons_households INT UNSIGNED,
+                household_size_9_persons_and_above_households INT UNSIGNED,
+                location_of_drinking_water_source_away_households INT UNSIGNED,
+                married_couples_1_households INT UNSIGNED,
+                married_couples_2_households INT UNSIGNED,
+                married_couples_3_households INT UNSIGNED,
+                married_couples_3_or_more_households INT UNSIGNED,
+                married_couples_4_households INT UNSIGNED,
+                married_couples_5_households INT UNSIGNED,
+                married_couples_none_households INT UNSIGNED,
                 FOREIGN KEY (District_code) REFERENCES Districts(District_code)
             )
             """
 
+            # Metric columns follow the DERIVED_METRICS catalogue
+            metric_columns = ''.join(f"{name} DOUBLE,\n                " for name in DERIVED_METRICS)
+
+            create_table_district_metrics = f"""
+            CREATE TABLE IF NOT EXISTS District_Metrics (
+                District_code SMALLINT UNSIGNED PRIMARY KEY,
+                {metric_columns}FOREIGN KEY (District_code) REFERENCES Districts(District_code)
+            )
+            """
+
+            create_table_state_metrics = f"""
+            CREATE TABLE IF NOT EXISTS State_Metrics (
+                state_id TINYINT UNSIGNED PRIMARY KEY,
+                {metric_columns}FOREIGN KEY (state_id) REFERENCES States(state_id)
+            )
+            """
+
+            create_table_load_progress = """
+            CREATE TABLE IF NOT EXISTS Load_Progress (
+                table_name VARCHAR(64) PRIMARY KEY,
+                last_district_code SMALLINT UNSIGNED NOT NULL
+            )
+            """
+
             # Execute SQL statements to create tables
             cursor.execute(create_table_states)
             cursor.execute(create_table_districts)
             cursor.execute(create_table_census_data)
             cursor.execute(create_table_household_data)
+            cursor.execute(create_table_district_metrics)
+            cursor.execute(create_table_state_metrics)
+            cursor.execute(create_table_load_progress)
 
             # Commit the changes to the database
             db_connection.commit()
@@ -366,16 +687,169 @@ def create_mysql_tables():
             cursor.close()
         
         else:
-            print("Failed to connect to the database.")
+            reporter.error("Failed to connect to the database.")
     
     except mysql.connector.Error as e:
-        st.error(f"An error occurred while creating tables: {e}")
+        reporter.error(f"An error occurred while creating tables: {e}")
 
     finally:
         # Close the database connection
         if db_connection.is_connected():
             db_connection.close()
 
+# Columns loaded into the Census_Data table as (MySQL column, DataFrame column) pairs
+CENSUS_DATA_COLUMNS = [
+    ('Population', 'Population'), ('male', 'Male'), ('female', 'Female'), ('literate', 'Literate'),
+    ('Literate_Male', 'Literate_Male'), ('Literate_Female', 'Literate_Female'),
+    ('sc', 'SC'), ('Male_SC', 'Male_SC'), ('Female_SC', 'Female_SC'),
+    ('st', 'ST'), ('Male_ST', 'Male_ST'), ('Female_ST', 'Female_ST'),
+    ('workers', 'Workers'), ('male_workers', 'Male_Workers'), ('female_workers', 'Female_Workers'),
+    ('main_workers', 'Main_Workers'), ('marginal_workers', 'Marginal_Workers'), ('Non_Workers', 'Non_Workers'),
+    ('Cultivator_Workers', 'Cultivator_Workers'), ('Agricultural_Workers', 'Agricultural_Workers'),
+    ('household_workers', 'Household_Workers'), ('other_workers', 'Other_Workers'),
+    ('hindus', 'Hindus'), ('muslims', 'Muslims'), ('christians', 'Christians'), ('sikhs', 'Sikhs'),
+    ('buddhists', 'Buddhists'), ('jains', 'Jains'), ('others_religions', 'Others_Religions'),
+    ('religion_not_stated', 'Religion_Not_Stated'),
+    ('below_primary_education', 'Below_Primary_Education'), ('primary_education', 'Primary_Education'),
+    ('middle_education', 'Middle_Education'), ('secondary_education', 'Secondary_Education'),
+    ('higher_education', 'Higher_Education'), ('graduate_education', 'Graduate_Education'),
+    ('other_education', 'Other_Education'), ('literate_education', 'Literate_Education'),
+    ('illiterate_education', 'Illiterate_Education'), ('total_education', 'Total_Education'),
+    ('Young_and_Adult', 'Young_and_Adult'), ('Middle_Aged', 'Middle_Aged'),
+    ('Senior_Citizen', 'Senior_Citizen'), ('Age_Not_Stated', 'Age_Not_Stated'),
+    ('power_parity_less_than_rs_45000', 'Power_Parity_Less_than_Rs_45000'),
+    ('power_parity_rs_45000_90000', 'Power_Parity_Rs_45000_90000'),
+    ('power_parity_rs_90000_150000', 'Power_Parity_Rs_90000_150000'),
+    ('power_parity_rs_45000_150000', 'Power_Parity_Rs_45000_150000'),
+    ('power_parity_rs_150000_240000', 'Power_Parity_Rs_150000_240000'),
+    ('power_parity_rs_240000_330000', 'Power_Parity_Rs_240000_330000'),
+    ('power_parity_rs_150000_330000', 'Power_Parity_Rs_150000_330000'),
+    ('power_parity_rs_330000_425000', 'Power_Parity_Rs_330000_425000'),
+    ('power_parity_rs_425000_545000', 'Power_Parity_Rs_425000_545000'),
+    ('power_parity_rs_330000_545000', 'Power_Parity_Rs_330000_545000'),
+    ('power_parity_above_rs_545000', 'Power_Parity_Above_Rs_545000'),
+    ('total_power_parity', 'Total_Power_Parity')
+]
+
+# Columns loaded into the Household_Data table as (MySQL column, DataFrame column) pairs
+HOUSEHOLD_DATA_COLUMNS = [
+    ('LPG_or_PNG_Households', 'LPG_or_PNG_Households'),
+    ('Housholds_with_Electric_Lighting', 'Housholds_with_Electric_Lighting'),
+    ('Households_with_Internet', 'Households_with_Internet'),
+    ('Households_with_Computer', 'Households_with_Computer'),
+    ('Households_Rural', 'Households_Rural'), ('Households_Urban', 'Households_Urban'),
+    ('households', 'Households'),
+    ('households_with_bicycle', 'Households_with_Bicycle'),
+    ('households_with_car_jeep_van', 'Households_with_Car_Jeep_Van'),
+    ('households_with_radio_transistor', 'Households_with_Radio_Transistor'),
+    ('households_with_scooter_motorcycle_moped', 'Households_with_Scooter_Motorcycle_Moped'),
+    ('households_with_telephone_mobile_phone_landline_only', 'Households_with_Telephone_Mobile_Phone_Landline_only'),
+    ('households_with_telephone_mobile_phone_mobile_only', 'Households_with_Telephone_Mobile_Phone_Mobile_only'),
+    ('multi_amenities_households', 'Multi_Amenities_Households'),
+    ('households_with_television', 'Households_with_Television'),
+    ('households_with_telephone_mobile_phone', 'Households_with_Telephone_Mobile_Phone'),
+    ('households_with_telephone_mobile_phone_both', 'Households_with_Telephone_Mobile_Phone_Both'),
+    ('condition_of_occupied_census_houses_dilapidated_households', 'Condition_of_occupied_census_houses_Dilapidated_Households'),
+    ('households_with_separate_kitchen_cooking_inside_house', 'Households_with_separate_kitchen_Cooking_inside_house'),
+    ('having_bathing_facility_total_households', 'Having_bathing_facility_Total_Households'),
+    ('having_latrine_facility_within_the_premises_total_households', 'Having_latrine_facility_within_the_premises_Total_Households'),
+    ('ownership_owned_households', 'Ownership_Owned_Households'),
+    ('ownership_rented_households', 'Ownership_Rented_Households'),
+    ('type_of_bathing_facility_enclosure_without_roof_households', 'Type_of_bathing_facility_Enclosure_without_roof_Households'),
+    ('type_of_fuel_used_for_cooking_any_other_households', 'Type_of_fuel_used_for_cooking_Any_other_Households'),
+    ('type_of_latrine_facility_pit_latrine_households', 'Type_of_latrine_facility_Pit_latrine_Households'),
+    ('type_of_latrine_facility_other_latrine_households', 'Type_of_latrine_facility_Other_latrine_Households'),
+    ('latrine_nightsoil_open_drain_households', 'Latrine_Nightsoil_Open_Drain_Households'),
+    ('latrine_flush_connected_other_system_households', 'Latrine_Flush_Connected_Other_System_Households'),
+    ('not_having_bathing_facility_within_the_premises_total_households', 'Not_having_bathing_facility_within_the_premises_Total_Households'),
+    ('no_latrine_open_source_households', 'No_Latrine_Open_Source_Households'),
+    ('main_source_of_drinking_water_un_covered_well_households', 'Main_source_of_drinking_water_Un_covered_well_Households'),
+    ('drinking_water_handpump_tubewell_borewell_households', 'Drinking_Water_Handpump_Tubewell_Borewell_Households'),
+    ('main_source_of_drinking_water_spring_households', 'Main_source_of_drinking_water_Spring_Households'),
+    ('main_source_of_drinking_water_river_canal_households', 'Main_source_of_drinking_water_River_Canal_Households'),
+    ('main_source_of_drinking_water_other_sources_households', 'Main_source_of_drinking_water_Other_sources_Households'),
+    ('drinking_water_other_sources_households', 'Drinking_Water_Other_Sources_Households'),
+    ('location_of_drinking_water_source_near_the_premises_households', 'Location_of_drinking_water_source_Near_the_premises_Households'),
+    ('location_of_drinking_water_source_within_the_premises_households', 'Location_of_drinking_water_source_Within_the_premises_Households'),
+    ('main_source_of_drinking_water_tank_pond_lake_households', 'Main_source_of_drinking_water_Tank_Pond_Lake_Households'),
+    ('main_source_of_drinking_water_tapwater_households', 'Main_source_of_drinking_water_Tapwater_Households'),
+    ('main_source_of_drinking_water_tubewell_borehole_households', 'Main_source_of_drinking_water_Tubewell_Borehole_Households'),
+    ('household_size_1_person_households', 'Household_size_1_person_Households'),
+    ('household_size_2_persons_households', 'Household_size_2_persons_Households'),
+    ('household_size_1_to_2_persons', 'Household_size_1_to_2_persons'),
+    ('household_size_3_persons_households', 'Household_size_3_persons_Households'),
+    ('household_size_3_to_5_persons_households', 'Household_size_3_to_5_persons_Households'),
+    ('household_size_4_persons_households', 'Household_size_4_persons_Households'),
+    ('household_size_5_persons_households', 'Household_size_5_persons_Households'),
+    ('household_size_6_8_persons_households', 'Household_size_6_8_persons_Households'),
+    ('household_size_9_persons_and_above_households', 'Household_size_9_persons_and_above_Households'),
+    ('location_of_drinking_water_source_away_households', 'Location_of_drinking_water_source_Away_Households'),
+    ('married_couples_1_households', 'Married_couples_1_Households'),
+    ('married_couples_2_households', 'Married_couples_2_Households'),
+    ('married_couples_3_households', 'Married_couples_3_Households'),
+    ('married_couples_3_or_more_households', 'Married_couples_3_or_more_Households'),
+    ('married_couples_4_households', 'Married_couples_4_Households'),
+    ('married_couples_5_households', 'Married_couples_5__Households'),
+    ('married_couples_none_households', 'Married_couples_None_Households')
+]
+
+
+# Function to build a multi-column INSERT statement for a table
+def build_insert_sql(table, columns):
+    placeholders = ', '.join(['%s'] * len(columns))
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+# Function to fetch the keys already present in the States and Districts tables
+def fetch_reference_keys():
+    # Connect to MySQL
+    db_connection = mysql.connector.connect(
+        host="localhost",
+        user=credentials['user'],
+        password=credentials['password'],
+        database="census_db"
+    )
+    cursor = db_connection.cursor()
+
+    # Map every State/UT name to its state_id
+    cursor.execute("SELECT State_or_UT, state_id FROM States")
+    state_ids = dict(cursor.fetchall())
+
+    # Collect every District_code that fact rows may reference
+    cursor.execute("SELECT District_code FROM Districts")
+    district_codes = {code for (code,) in cursor.fetchall()}
+
+    # Close the cursor and the connection
+    cursor.close()
+    db_connection.close()
+
+    return district_codes, state_ids
+
+
+# Function to drop the census tables, so that create_mysql_tables rebuilds them with the current schema
+def drop_mysql_tables():
+    db_connection = None
+    try:
+        # Connect to MySQL
+        db_connection = connect_to_census_db()
+        cursor = db_connection.cursor()
+
+        # Drop the tables that reference others first
+        cursor.execute("DROP TABLE IF EXISTS Load_Progress, State_Metrics, District_Metrics, "
+                       "Household_Data, Census_Data, Districts, States")
+
+        # Close the cursor
+        cursor.close()
+
+    except mysql.connector.Error as e:
+        reporter.error(f"An error occurred while dropping tables: {e}")
+
+    finally:
+        # Close the database connection
+        if db_connection is not None and db_connection.is_connected():
+            db_connection.close()
+
+
 # Function to upload States data
 def upload_to_states_table(df):
     try:
@@ -388,16 +862,14 @@ def upload_to_states_table(df):
         )
         cursor = db_connection.cursor()
 
-        # Insert unique State records
-        for _, row in df.iterrows():
-            # Check if the state already exists
-            cursor.execute("SELECT state_id FROM States WHERE State_or_UT = %s", (row['State/UT'],))
-            result = cursor.fetchone()
-            
-            # If the state does not exist, insert it
-            if result is None:
-                sql = "INSERT INTO States (State_or_UT) VALUES (%s)"
-                cursor.execute(sql, (row['State/UT'],))
+        # Fetch the states that already exist in one query
+        cursor.execute("SELECT State_or_UT FROM States")
+        existing_states = {state for (state,) in cursor.fetchall()}
+
+        # Insert unique State records that do not exist yet
+        new_states = [state for state in df['State/UT'].drop_duplicates() if state not in existing_states]
+        if new_states:
+            cursor.executemany("INSERT INTO States (State_or_UT) VALUES (%s)", [(state,) for state in new_states])
 
         # Commit the changes to the database
         db_connection.commit()
@@ -406,7 +878,7 @@ def upload_to_states_table(df):
         cursor.close()
 
     except mysql.connector.Error as e:
-        st.error(f"An error occurred while uploading data to states table: {e}")
+        reporter.error(f"An error occurred while uploading data to states table: {e}")
 
     finally:
         # Close the database connection
@@ -426,27 +898,20 @@ def upload_to_districts_table(df):
         )
         cursor = db_connection.cursor()
 
-        # Insert unique District records
-        for _, row in df.iterrows():
-            try:
-                # Retrieve state_id for the given state_name
-                cursor.execute("SELECT state_id FROM States WHERE State_or_UT = %s", (row['State/UT'],))
-                state_result = cursor.fetchone()
-
-                if state_result is not None:
-                    state_id = state_result[0]
-                
-                    # Check if the district already exists
-                    cursor.execute("SELECT District_code FROM Districts WHERE  District = %s", (row['District'],))
-                    result = cursor.fetchone()
-                
-                    # If the district does not exist, insert it
-                    if result is None:
-                        sql = "INSERT INTO Districts (District_code, District, state_id) VALUES (%s, %s, %s)"
-                        cursor.execute(sql, (row['District_code'], row['District'], state_id))
-
-            except mysql.connector.Error as e:
-                st.error(f"Error processing districts row {row}: {e}")
+        # Retrieve the state_id of every state and the districts that already exist in two queries
+        cursor.execute("SELECT State_or_UT, state_id FROM States")
+        state_ids = dict(cursor.fetchall())
+        cursor.execute("SELECT District_code FROM Districts")
+        existing_districts = {code for (code,) in cursor.fetchall()}
+
+        # Insert unique District records whose state exists and which do not exist yet; names repeat across
+        # states, so districts are identified by their code
+        districts = df[['District_code', 'District', 'State/UT']].drop_duplicates(subset='District_code')
+        districts = districts[districts['State/UT'].isin(state_ids) & ~districts['District_code'].isin(existing_districts)]
+        rows = [(int(code), district, state_ids[state]) for code, district, state in districts.itertuples(index=False)]
+        if rows:
+            sql = "INSERT INTO Districts (District_code, District, state_id) VALUES (%s, %s, %s)"
+            cursor.executemany(sql, rows)
 
         # Commit the changes to the database
         db_connection.commit()
@@ -455,7 +920,7 @@ def upload_to_districts_table(df):
         cursor.close()
 
     except mysql.connector.Error as e:
-        st.error(f"An error occurred while uploading data to districts table: {e}")
+        reporter.error(f"An error occurred while uploading data to districts table: {e}")
 
     finally:
         # Close the database connection
@@ -463,137 +928,181 @@ def upload_to_districts_table(df):
             db_connection.close()
             
 
-# Function to upload census data
-def upload_to_census_data_table(df):
+# Rows per transaction when loading the fact tables
+BATCH_SIZE = 100
+
+# Retry settings for transient MySQL errors: wait RETRY_BASE_DELAY * 2**attempt seconds between attempts
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.5
+
+# Function to connect to the census_db database
+def connect_to_census_db():
+    return mysql.connector.connect(
+        host="localhost",
+        user=credentials['user'],
+        password=credentials['password'],
+        database="census_db"
+    )
+
+
+# Function to run an operation again with exponential backoff when it fails with a transient error
+def with_retry(operation, retries=MAX_RETRIES, base_delay=RETRY_BASE_DELAY):
+    for attempt in range(retries + 1):
+        try:
+            return operation()
+        # Errors worth retrying: the connection dropped or the server was briefly unavailable
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            if attempt == retries:
+                raise
+            time.sleep(base_delay * 2 ** attempt)
+
+
+# Function to read the last District_code committed for a table
+def get_high_water_mark(cursor, table):
+    cursor.execute("SELECT last_district_code FROM Load_Progress WHERE table_name = %s", (table,))
+    result = cursor.fetchone()
+    return None if result is None else result[0]
+
+
+# Function to insert one batch and advance the high-water mark in the same transaction
+def load_batch(db_connection, table, sql, batch):
+    # Reconnect first if the previous attempt lost the connection
+    if not db_connection.is_connected():
+        db_connection.reconnect()
+
+    cursor = db_connection.cursor()
     try:
-        # Connect to MySQL
-        db_connection = mysql.connector.connect(
-            host="localhost",
-            user=credentials['user'],
-            password=credentials['password'],
-            database="census_db"
+        db_connection.start_transaction()
+
+        # Skip the batch when an earlier attempt committed it but lost the connection before the acknowledgement
+        last_district_code = int(batch['District_code'].iloc[-1])
+        high_water_mark = get_high_water_mark(cursor, table)
+        if high_water_mark is not None and high_water_mark >= last_district_code:
+            db_connection.rollback()
+            return
+
+        cursor.executemany(sql, batch.values.tolist())
+        cursor.execute(
+            "INSERT INTO Load_Progress (table_name, last_district_code) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE last_district_code = VALUES(last_district_code)",
+            (table, last_district_code)
         )
-        cursor = db_connection.cursor()
+        db_connection.commit()
 
-        # Replace NaN values with 0
-        df = df.fillna(value=0)
-
-        # Insert CensusData records
-        for _, row in df.iterrows():
-            try:
-                # Retrieve District_code for the given District
-                cursor.execute("SELECT District_code FROM Districts WHERE District = %s", (row['District'],))
-                district_result = cursor.fetchone()
-
-                if district_result is not None:
-                    District_code = district_result[0]
-                
-                    # Prepare SQL statement
-                    sql = """
-                        INSERT INTO Census_Data (District_code, Population, male, female, literate, Literate_Male, 
-                        Literate_Female, sc, Male_SC, Female_SC, st, Male_ST, Female_ST, workers, male_workers, female_workers, 
-                        main_workers, marginal_workers, Non_Workers, Cultivator_Workers, Agricultural_Workers, household_workers, other_workers, hindus, muslims, 
-                        christians, sikhs, buddhists, jains, others_religions, religion_not_stated, below_primary_education, primary_education, middle_education, secondary_education, 
-                        higher_education, graduate_education, other_education, literate_education, illiterate_education, total_education, Young_and_Adult, Middle_Aged, Senior_Citizen, 
-                        Age_Not_Stated, power_parity_less_than_rs_45000, power_parity_rs_45000_90000, power_parity_rs_90000_150000, power_parity_rs_45000_150000, power_parity_rs_150000_240000, 
-                        power_parity_rs_240000_330000, power_parity_rs_150000_330000, power_parity_rs_330000_425000, power_parity_rs_425000_545000, power_parity_rs_330000_545000, 
-                        power_parity_above_rs_545000, total_power_parity)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    # Execute SQL statement with row data
-                    cursor.execute(sql, (
-                        District_code, row['Population'], row['Male'], row['Female'], row['Literate'], row['Literate_Male'], 
-                        row['Literate_Female'], row['SC'], row['Male_SC'], row['Female_SC'], row['ST'], row['Male_ST'], row['Female_ST'], row['Workers'], row['Male_Workers'], row['Female_Workers'], 
-                        row['Main_Workers'], row['Marginal_Workers'], row['Non_Workers'], row['Cultivator_Workers'], row['Agricultural_Workers'], row['Household_Workers'], row['Other_Workers'], 
-                        row['Hindus'], row['Muslims'], row['Christians'], row['Sikhs'], row['Buddhists'], row['Jains'], 
-                        row['Others_Religions'], row['Religion_Not_Stated'], row['Below_Primary_Education'], row['Primary_Education'], 
-                        row['Middle_Education'], row['Secondary_Education'], row['Higher_Education'], row['Graduate_Education'], 
-                        row['Other_Education'], row['Literate_Education'], row['Illiterate_Education'], row['Total_Education'], 
-                        row['Young_and_Adult'], row['Middle_Aged'], row['Senior_Citizen'], row['Age_Not_Stated'], 
-                        row['Power_Parity_Less_than_Rs_45000'], row['Power_Parity_Rs_45000_90000'], row['Power_Parity_Rs_90000_150000'], 
-                        row['Power_Parity_Rs_45000_150000'], row['Power_Parity_Rs_150000_240000'], row['Power_Parity_Rs_240000_330000'], 
-                        row['Power_Parity_Rs_150000_330000'], row['Power_Parity_Rs_330000_425000'], row['Power_Parity_Rs_425000_545000'], 
-                        row['Power_Parity_Rs_330000_545000'], row['Power_Parity_Above_Rs_545000'], row['Total_Power_Parity']
-                    ))
-                    
-            except mysql.connector.Error as e:
-                print(f"Error processing CensusData row {row}: {e}")
+    except mysql.connector.Error:
+        # Undo the partial batch; the connection may already be gone, in which case the server rolls back
+        try:
+            db_connection.rollback()
+        except mysql.connector.Error:
+            pass
+        raise
 
-        # Commit the changes to the database
-        db_connection.commit()
+    finally:
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            pass
 
-        # Close the cursor
+
+# Function to upload a fact table in District_code order, one transaction per batch
+def upload_fact_table(df, table, columns, resume=False, batch_size=BATCH_SIZE):
+    # Replace NaN values with 0 and order the rows by District_code so that the high-water mark is meaningful
+    df = df.fillna(value=0)
+    rows = df[['District_code'] + [column for _, column in columns]].astype('int64').sort_values('District_code')
+
+    # Prepare SQL statement
+    sql = build_insert_sql(table, ['District_code'] + [column for column, _ in columns])
+
+    db_connection = None
+    try:
+        db_connection = with_retry(connect_to_census_db)
+        cursor = db_connection.cursor()
+
+        if resume:
+            # Skip every district up to the last committed batch
+            high_water_mark = get_high_water_mark(cursor, table)
+            if high_water_mark is not None:
+                rows = rows[rows['District_code'] > high_water_mark]
+        else:
+            # A fresh load replaces whatever an earlier run wrote, so that reruns never duplicate rows
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute("DELETE FROM Load_Progress WHERE table_name = %s", (table,))
+            db_connection.commit()
         cursor.close()
 
+        # Insert the records batch by batch, retrying transient errors
+        for start in range(0, len(rows), batch_size):
+            batch = rows.iloc[start:start + batch_size]
+            with_retry(lambda: load_batch(db_connection, table, sql, batch))
+
     except mysql.connector.Error as e:
-        print(f"An error occurred while uploading data to census_data table: {e}")
+        reporter.error(f"An error occurred while uploading data to {table.lower()} table: {e}. "
+                 "Rerun with --resume to continue from the last committed batch.")
 
     finally:
         # Close the database connection
-        if db_connection.is_connected():
+        if db_connection is not None and db_connection.is_connected():
             db_connection.close()
 
 
+# Function to upload census data
+def upload_to_census_data_table(df, resume=False, batch_size=BATCH_SIZE):
+    upload_fact_table(df, 'Census_Data', CENSUS_DATA_COLUMNS, resume, batch_size)
+
+
 # Function to upload household data
-def upload_to_household_data_table(df):
+def upload_to_household_data_table(df, resume=False, batch_size=BATCH_SIZE):
+    upload_fact_table(df, 'Household_Data', HOUSEHOLD_DATA_COLUMNS, resume, batch_size)
+
+
+# Function to add the columns of catalogue entries that a metrics table does not have yet
+def ensure_metric_columns(cursor, table, metrics):
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = 'census_db' AND TABLE_NAME = %s",
+        (table,)
+    )
+    existing_columns = {column.lower() for (column,) in cursor.fetchall()}
+    for name in metrics:
+        if name.lower() not in existing_columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} DOUBLE")
+
+
+# Function to upsert one row of metrics per key into a metrics table
+def upsert_metrics(cursor, table, key, keys, metrics):
+    names = list(metrics.columns)
+    sql = (build_insert_sql(table, [key] + names)
+           + " ON DUPLICATE KEY UPDATE " + ', '.join(f"{name} = VALUES({name})" for name in names))
+
+    # Store NaN as NULL
+    values = metrics.astype(object).where(metrics.notna(), None).values.tolist()
+    cursor.executemany(sql, [[key_value] + row for key_value, row in zip(keys, values)])
+
+
+# Function to upload the derived metrics of every district and state
+def upload_to_metrics_tables(df, metrics=None):
+    metrics = metrics or DERIVED_METRICS
+    db_connection = None
     try:
         # Connect to MySQL
-        db_connection = mysql.connector.connect(
-            host="localhost",
-            user=credentials['user'],
-            password=credentials['password'],
-            database="census_db"
-        )
+        db_connection = connect_to_census_db()
         cursor = db_connection.cursor()
 
-        # Replace NaN values with 0
-        df = df.fillna(value=0)
-
-        # Insert HouseholdData records
-        for _, row in df.iterrows():
-            try:
-                # Retrieve District_code for the given District
-                cursor.execute("SELECT District_code FROM Districts WHERE District = %s", (row['District'],))
-                district_result = cursor.fetchone()
-
-                if district_result is not None:
-                    District_code = district_result[0]
-
-                    # Prepare SQL statement
-                    sql = """
-                        INSERT INTO Household_Data (District_code, LPG_or_PNG_Households, Housholds_with_Electric_Lighting, Households_with_Internet, Households_with_Computer, Households_Rural, 
-                        Households_Urban, households, households_with_bicycle, households_with_car_jeep_van, households_with_radio_transistor, households_with_scooter_motorcycle_moped, 
-                        households_with_telephone_mobile_phone_landline_only, households_with_telephone_mobile_phone_mobile_only, multi_amenities_households, households_with_television, 
-                        households_with_telephone_mobile_phone, households_with_telephone_mobile_phone_both, condition_of_occupied_census_houses_dilapidated_households, households_with_separate_kitchen_cooking_inside_house, 
-                        having_bathing_facility_total_households, having_latrine_facility_within_the_premises_total_households, ownership_owned_households, ownership_rented_households, type_of_bathing_facility_enclosure_without_roof_households, 
-                        type_of_fuel_used_for_cooking_any_other_households, type_of_latrine_facility_pit_latrine_households, type_of_latrine_facility_other_latrine_households, latrine_nightsoil_open_drain_households, 
-                        latrine_flush_connected_other_system_households, not_having_bathing_facility_within_the_premises_total_households, no_latrine_open_source_households, main_source_of_drinking_water_un_covered_well_households, 
-                        drinking_water_handpump_tubewell_borewell_households, main_source_of_drinking_water_spring_households, main_source_of_drinking_water_river_canal_households, main_source_of_drinking_water_other_sources_households, 
-                        drinking_water_other_sources_households, location_of_drinking_water_source_near_the_premises_households, location_of_drinking_water_source_within_the_premises_households, main_source_of_drinking_water_tank_pond_lake_households, 
-                        main_source_of_drinking_water_tapwater_households, main_source_of_drinking_water_tubewell_borehole_households, household_size_1_person_households, household_size_2_persons_households, household_size_1_to_2_persons, 
-                        household_size_3_persons_households, household_size_3_to_5_persons_households, household_size_4_persons_households, household_size_5_persons_households, household_size_6_8_persons_households, 
-                        household_size_9_persons_and_above_households, location_of_drinking_water_source_away_households, married_couples_1_households, married_couples_2_households, married_couples_3_households, married_couples_3_or_more_households, 
-                        married_couples_4_households, married_couples_5_households, married_couples_none_households)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    # Execute SQL statement with row data
-                    cursor.execute(sql,( 
-                        District_code, row['LPG_or_PNG_Households'], row['Housholds_with_Electric_Lighting'], row['Households_with_Internet'], row['Households_with_Computer'], row['Households_Rural'],  
-                        row['Households_Urban'], row['Households'], row['Households_with_Bicycle'], row['Households_with_Car_Jeep_Van'], row['Households_with_Radio_Transistor'], row['Households_with_Scooter_Motorcycle_Moped'],  
-                        row['Households_with_Telephone_Mobile_Phone_Landline_only'], row['Households_with_Telephone_Mobile_Phone_Mobile_only'], row['Multi_Amenities_Households'], row['Households_with_Television'], row['Households_with_Telephone_Mobile_Phone'],  
-                        row['Households_with_Telephone_Mobile_Phone_Both'], row['Condition_of_occupied_census_houses_Dilapidated_Households'], row['Households_with_separate_kitchen_Cooking_inside_house'], row['Having_bathing_facility_Total_Households'], row['Having_latrine_facility_within_the_premises_Total_Households'],  
-                        row['Ownership_Owned_Households'], row['Ownership_Rented_Households'], row['Type_of_bathing_facility_Enclosure_without_roof_Households'], row['Type_of_fuel_used_for_cooking_Any_other_Households'], row['Type_of_latrine_facility_Pit_latrine_Households'],  
-                        row['Type_of_latrine_facility_Other_latrine_Households'], row['Latrine_Nightsoil_Open_Drain_Households'], row['Latrine_Flush_Connected_Other_System_Households'], row['Not_having_bathing_facility_within_the_premises_Total_Households'], row['No_Latrine_Open_Source_Households'], 
-                        row['Main_source_of_drinking_water_Un_covered_well_Households'], row['Drinking_Water_Handpump_Tubewell_Borewell_Households'], row['Main_source_of_drinking_water_Spring_Households'], row['Main_source_of_drinking_water_River_Canal_Households'], row['Main_source_of_drinking_water_Other_sources_Households'], 
-                        row['Drinking_Water_Other_Sources_Households'], row['Location_of_drinking_water_source_Near_the_premises_Households'], row['Location_of_drinking_water_source_Within_the_premises_Households'], row['Main_source_of_drinking_water_Tank_Pond_Lake_Households'], 
-                        row['Main_source_of_drinking_water_Tapwater_Households'], row['Main_source_of_drinking_water_Tubewell_Borehole_Households'], row['Household_size_1_person_Households'], row['Household_size_2_persons_Households'], row['Household_size_1_to_2_persons'], 
-                        row['Household_size_3_persons_Households'], row['Household_size_3_to_5_persons_Households'], row['Household_size_4_persons_Households'], row['Household_size_5_persons_Households'], row['Household_size_6_8_persons_Households'], 
-                        row['Household_size_9_persons_and_above_Households'], row['Location_of_drinking_water_source_Away_Households'], row['Married_couples_1_Households'], row['Married_couples_2_Households'], row['Married_couples_3_Households'], 
-                        row['Married_couples_3_or_more_Households'], row['Married_couples_4_Households'], row['Married_couples_5__Households'], row['Married_couples_None_Households']
-                    ))
-
-            except mysql.connector.Error as e:
-                st.error(f"Error processing household_data row {row}: {e}")
+        # Follow the catalogue when it gained entries since the tables were created
+        ensure_metric_columns(cursor, 'District_Metrics', metrics)
+        ensure_metric_columns(cursor, 'State_Metrics', metrics)
+
+        # Upsert the district metrics that the cleaning stage added as columns
+        district_metrics = df[list(metrics)]
+        upsert_metrics(cursor, 'District_Metrics', 'District_code',
+                       [int(code) for code in df['District_code']], district_metrics)
+
+        # Upsert the state metrics, keyed by the state_id of each State/UT
+        cursor.execute("SELECT State_or_UT, state_id FROM States")
+        state_ids = dict(cursor.fetchall())
+        state_metrics = compute_state_metrics(df, metrics)
+        state_metrics = state_metrics[state_metrics.index.isin(state_ids)]
+        upsert_metrics(cursor, 'State_Metrics', 'state_id',
+                       [state_ids[state] for state in state_metrics.index], state_metrics)
 
         # Commit the changes to the database
         db_connection.commit()
@@ -602,158 +1111,427 @@ def upload_to_household_data_table(df):
         cursor.close()
 
     except mysql.connector.Error as e:
-        st.error(f"An error occurred while uploading data to household_data table: {e}")
+        reporter.error(f"An error occurred while uploading data to the metrics tables: {e}")
 
     finally:
         # Close the database connection
-        if db_connection.is_connected():
+        if db_connection is not None and db_connection.is_connected():
             db_connection.close()
 
 
-# Task 7: Run Query on the database and show output on streamlit
+# Task 6a: Reconcile the Stores with Aggregate Checksums
+
+# Column groups that are reconciled, named after the MySQL fact table that stores them
+RECONCILE_TABLES = {'Census_Data': CENSUS_DATA_COLUMNS, 'Household_Data': HOUSEHOLD_DATA_COLUMNS}
+
+# Modulus and district multiplier of the order-independent digest. Every value is reduced modulo DIGEST_MODULUS
+# and multiplied by a weight that depends on its District_code and column, so each product fits in 64 bits and a
+# value moved to another district or column changes the digest even when the column sums still match.
+DIGEST_MODULUS = 2**31 - 1
+DIGEST_MULTIPLIER = 1000003
+
+# Define a function to summarise the in-memory DataFrame per state (or per district) and table
+def summarize_dataframe(df, key='State/UT', states=None):
+    if states is not None:
+        df = df[df['State/UT'].isin(states)]
+    keys = df['District_code'].astype('int64') if key == 'District_code' else df[key]
+    codes = df['District_code'].astype('int64').to_numpy()
+
+    summaries = []
+    for table, columns in RECONCILE_TABLES.items():
+        values = df[[column for _, column in columns]].fillna(0).astype('int64')
+
+        # Digest of each row: sum over columns of (value mod M) * ((District_code * K + column index) mod M), mod M
+        weights = (codes[:, None] * DIGEST_MULTIPLIER + np.arange(len(columns))) % DIGEST_MODULUS
+        terms = (values.to_numpy() % DIGEST_MODULUS) * weights % DIGEST_MODULUS
+        digests = pd.Series(terms.sum(axis=1), index=df.index)
+
+        # Row count, column sums and the digest summed over the rows of each group
+        grouped = values.groupby(keys)
+        summary = pd.concat([grouped.size().rename('row_count'), grouped.sum(),
+                             (digests.groupby(keys).sum() % DIGEST_MODULUS).rename('digest')], axis=1)
+        summaries.append(summary.set_index(pd.MultiIndex.from_product([[table], summary.index], names=['table', 'key'])))
+
+    return pd.concat(summaries)
+
+
+# Define a function to compute the same summaries inside MySQL
+def summarize_mysql(key='State/UT', states=None):
+    group = 'f.District_code' if key == 'District_code' else 's.State_or_UT'
+
+    # Only the divergent states are summarised when drilling down to districts
+    where, params = '', ()
+    if states is not None:
+        where = f"WHERE s.State_or_UT IN ({', '.join(['%s'] * len(states))})"
+        params = tuple(states)
 
-# Define a function to execute a MySQL query and return the result as a pandas DataFrame
-def execute_query(query):
     # Connect to MySQL
-    db_connection = mysql.connector.connect(
-        host="localhost",
-        user=credentials['user'],
-        password=credentials['password'],
-        database="census_db"
-        )    
-    cursor = db_connection.cursor(dictionary=True)
-    
-    # Execute the query
-    cursor.execute(query)
-    
-    # Fetch all results
-    result = cursor.fetchall()
-    
+    db_connection = connect_to_census_db()
+    cursor = db_connection.cursor()
+
+    summaries = []
+    for table, columns in RECONCILE_TABLES.items():
+        sums = ', '.join(f"SUM(COALESCE(f.{column}, 0)) AS {name}" for column, name in columns)
+        terms = ' + '.join(
+            f"MOD(MOD(COALESCE(f.{column}, 0), {DIGEST_MODULUS}) * "
+            f"MOD(f.District_code * {DIGEST_MULTIPLIER} + {index}, {DIGEST_MODULUS}), {DIGEST_MODULUS})"
+            for index, (column, _) in enumerate(columns)
+        )
+        query = f"""
+        SELECT {group} AS reconcile_key, COUNT(*) AS row_count, {sums}, MOD(SUM({terms}), {DIGEST_MODULUS}) AS digest
+        FROM {table} f JOIN Districts d ON f.District_code = d.District_code
+        JOIN States s ON s.state_id = d.state_id {where} GROUP BY {group}
+        """
+        cursor.execute(query, params)
+        names = [column[0] for column in cursor.description]
+        summary = pd.DataFrame(cursor.fetchall(), columns=names).set_index('reconcile_key').astype('int64')
+        summaries.append(summary.set_index(pd.MultiIndex.from_product([[table], summary.index], names=['table', 'key'])))
+
     # Close the cursor and the connection
     cursor.close()
     db_connection.close()
-    
-    # Convert the result to a pandas DataFrame and return it
-    return pd.DataFrame(result)
+
+    return pd.concat(summaries)
+
+
+# Define a function to compute the same summaries inside MongoDB
+def summarize_mongodb(key='State/UT', states=None):
+    # Create a connection to the MongoDB server running on localhost at the default port 27017
+    client = pymongo.MongoClient("mongodb://localhost:27017/")
+    collection = client["census_db"]["census"]
+
+    code = {'$toLong': '$District_code'}
+    summaries = []
+    try:
+        for table, columns in RECONCILE_TABLES.items():
+            group = {'_id': code if key == 'District_code' else '$State/UT', 'row_count': {'$sum': 1}}
+            terms = []
+            for index, (_, name) in enumerate(columns):
+                value = {'$toLong': {'$ifNull': [f'${name}', 0]}}
+                group[name] = {'$sum': value}
+                weight = {'$mod': [{'$add': [{'$multiply': [code, DIGEST_MULTIPLIER]}, index]}, DIGEST_MODULUS]}
+                terms.append({'$mod': [{'$multiply': [{'$mod': [value, DIGEST_MODULUS]}, weight]}, DIGEST_MODULUS]})
+            group['digest'] = {'$sum': {'$add': terms}}
+
+            # Only the divergent states are summarised when drilling down to districts
+            pipeline = [{'$match': {'State/UT': {'$in': list(states)}}}] if states is not None else []
+            pipeline += [{'$group': group}, {'$set': {'digest': {'$mod': ['$digest', DIGEST_MODULUS]}}}]
+
+            # Name the columns, so that a state missing from MongoDB gives an empty summary
+            names = ['_id', 'row_count'] + [name for _, name in columns] + ['digest']
+            summary = pd.DataFrame(list(collection.aggregate(pipeline)), columns=names).set_index('_id').astype('int64')
+            summaries.append(summary.set_index(pd.MultiIndex.from_product([[table], summary.index], names=['table', 'key'])))
+
+    finally:
+        # Close the connection to the MongoDB server
+        client.close()
+
+    return pd.concat(summaries)
+
+
+# Define a function to list the fields whose summaries differ between the DataFrame and a store
+def compare_summaries(expected, actual, store):
+    expected, actual = expected.align(actual, join='outer')
+    expected, actual = expected.astype('Int64'), actual.astype('Int64')
+    differences = (expected != actual).fillna(expected.isna() != actual.isna())
+
+    # A state or district missing from one side is reported once, through its row count
+    missing = expected['row_count'].isna() | actual['row_count'].isna()
+    differences.loc[missing] = False
+    differences.loc[missing, 'row_count'] = True
+    differences = differences.stack()
+    return pd.DataFrame(
+        [(store, table, key, field, expected.at[(table, key), field], actual.at[(table, key), field])
+         for table, key, field in differences[differences].index],
+        columns=['store', 'table', 'key', 'field', 'expected', 'actual']
+    )
+
+
+# Define a function to reconcile the stores with the DataFrame and pinpoint divergent states and districts
+def reconcile_stores(df, stores=('mysql', 'mongodb')):
+    summarizers = {'mysql': summarize_mysql, 'mongodb': summarize_mongodb}
+    expected = summarize_dataframe(df)
+
+    discrepancies = []
+    for store in stores:
+        # Compare the per-state summaries first
+        state_differences = compare_summaries(expected, summarizers[store](), store)
+        if state_differences.empty:
+            continue
+
+        # Drill down to districts, but only inside the states that diverge
+        states = sorted(state_differences['key'].unique())
+        district_differences = compare_summaries(
+            summarize_dataframe(df, 'District_code', states), summarizers[store]('District_code', states), store
+        )
+        discrepancies += [state_differences.assign(level='state'), district_differences.assign(level='district')]
+
+    if not discrepancies:
+        return pd.DataFrame(columns=['store', 'table', 'key', 'field', 'expected', 'actual', 'level'])
+    return pd.concat(discrepancies, ignore_index=True)
+
+
+# Define a function to report the outcome of the reconciliation
+def report_reconciliation(discrepancies):
+    reporter.subheader('Reconciliation of MongoDB and MySQL with the cleaned data')
+    if discrepancies.empty:
+        reporter.info('Row counts, column sums and digests match in every state.')
+        return
+
+    reporter.warning(f"{discrepancies['key'][discrepancies['level'] == 'state'].nunique()} states diverge.")
+    reporter.dataframe(discrepancies)
+
+
+# Task 7: Run Query on the database and show output on streamlit
+
+# Report connections stay open per thread, with a prepared-statement cursor cached per SQL text on each connection.
+# Long-lived threads such as the report service workers reuse them; display_dataframes and run_parallel close
+# theirs when they are done, as their threads do not outlive the call.
+report_connections = threading.local()
+
+# Prepared statements kept per report connection; the least recently used one is closed first
+PREPARED_STATEMENT_CACHE_SIZE = 32
+
+# Define a function to get the cached prepared cursor of a query on this thread's report connection
+def get_prepared_cursor(query):
+    if getattr(report_connections, 'connection', None) is None:
+        report_connections.connection = connect_to_census_db()
+        report_connections.cursors = OrderedDict()
+
+        # Without autocommit the first SELECT opens a snapshot that is never closed, and a long-lived thread
+        # would keep reading the data as it was then
+        report_connections.connection.autocommit = True
+
+    # Prepare each distinct SQL text once per connection; the cached text object is passed back on every execute
+    cursors = report_connections.cursors
+    if query in cursors:
+        cursors.move_to_end(query)
+    else:
+        cursors[query] = (report_connections.connection.cursor(prepared=True), query)
+        if len(cursors) > PREPARED_STATEMENT_CACHE_SIZE:
+            _, (cursor, _) = cursors.popitem(last=False)
+            close_cursor(cursor)
+    return cursors[query]
+
+
+# Define a function to close a cursor and its prepared statement, ignoring a connection that is already gone
+def close_cursor(cursor):
+    try:
+        cursor.close()
+    except mysql.connector.Error:
+        pass
+
+
+# Define a function to drop the cached cursor of a query whose statement failed
+def discard_prepared_cursor(query):
+    entry = getattr(report_connections, 'cursors', {}).pop(query, None)
+    if entry is not None:
+        close_cursor(entry[0])
+
+
+# Define a function to close this thread's report connection and forget its prepared statements
+def close_report_connection():
+    connection = getattr(report_connections, 'connection', None)
+    report_connections.connection = None
+    report_connections.cursors = OrderedDict()
+    if connection is not None:
+        try:
+            connection.close()
+        except mysql.connector.Error:
+            pass
+
+
+# Define a function to execute a MySQL query and return the result as a pyarrow Table
+def execute_query(query, params=()):
+    def run():
+        cursor, prepared_query = get_prepared_cursor(query)
+        try:
+            # Execute the prepared statement with the given parameters
+            cursor.execute(prepared_query, params)
+            return cursor.fetchall(), [column[0] for column in cursor.description]
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            # Forget the broken connection so that the retry opens a new one
+            close_report_connection()
+            raise
+        except mysql.connector.Error:
+            # Do not keep a statement the server rejected
+            discard_prepared_cursor(query)
+            raise
+
+    # Fetch all results as plain tuples and transpose them into one sequence per column
+    rows, names = with_retry(run, retries=1)
+    columns = list(zip(*rows)) if rows else [[] for _ in names]
+
+    # Build Arrow columns directly, so Streamlit can serialize the result without a per-row dict or DataFrame copy
+    return pa.Table.from_arrays([pa.array(column) for column in columns], names=names)
+
+
+# Define a function to run a report query with optional server-side filters, ordering and limit.
+# The query is the SELECT ... FROM ... JOIN part of the report; level is 'district' or 'state' and says which
+# column the report is keyed by, and grouped says whether rows are aggregated by that column.
+# Filters: states and districts restrict the rows to the given State/UT and District names, order_by names an
+# output column to sort by (descending for largest first) and limit caps the number of rows returned.
+def run_report(query, level, grouped=True, states=None, districts=None, order_by=None, descending=False, limit=None):
+    # Only the columns the report returns can be sorted on, which also bounds the distinct statements prepared
+    if order_by:
+        columns = {column.lower(): column for column in get_output_columns(query)}
+        if order_by.lower() not in columns:
+            raise ValueError(f"Invalid column to order by: {order_by}")
+        order_by = columns[order_by.lower()]
+
+    conditions, params = [], []
+
+    if states:
+        # District reports only reach the state names through the States table
+        if level == 'district':
+            query += " JOIN states ON states.state_id = districts.state_id"
+        conditions.append(f"State_or_UT IN ({', '.join(['%s'] * len(states))})")
+        params += list(states)
+
+    if districts:
+        if level == 'state' and not grouped:
+            raise ValueError("State lookups cannot be filtered by district")
+        conditions.append(f"district IN ({', '.join(['%s'] * len(districts))})")
+        params += list(districts)
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    # District names repeat across states, so districts are grouped by their code
+    if grouped:
+        query += " GROUP BY " + ('districts.District_code, district' if level == 'district' else 'State_or_UT')
+
+    # Column names cannot be parameters; order_by is one of the report's own output columns
+    if order_by:
+        query += f" ORDER BY `{order_by}` {'DESC' if descending else 'ASC'}"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(int(limit))
+
+    return execute_query(query, tuple(params))
+
+# Define a function to list the output columns of a report query, from the aliases of its SELECT list
+def get_output_columns(query):
+    select = re.search(r'SELECT(.*?)\bFROM\b', query, re.S | re.I).group(1)
+    return [re.split(r'\s+as\s+', item.strip(), flags=re.I)[-1] for item in select.split(',')]
+
 
 # Define a function to get the total population for each district
-def get_total_population():
+def get_total_population(**filters):
     query = """SELECT district, SUM(population) as total_population FROM census_data 
-    JOIN districts ON census_data.District_code = districts.District_code GROUP BY district;"""
-    return execute_query(query)
+    JOIN districts ON census_data.District_code = districts.District_code"""
+    return run_report(query, 'district', **filters)
 
 
 # Define a function to get the literate males and females for each district
-def get_literate_males_females():
+def get_literate_males_females(**filters):
     query = """
     SELECT district, SUM(Literate_Male) as literate_males, SUM(Literate_Female) as literate_females FROM census_data 
-    JOIN districts ON census_data.District_code = districts.District_code GROUP BY district;
+    JOIN districts ON census_data.District_code = districts.District_code
     """
-    return execute_query(query)
+    return run_report(query, 'district', **filters)
 
 
 # Define a function to get the worker percentage for each district
-def get_worker_percentage():
+def get_worker_percentage(**filters):
     query = """
-    SELECT district, 
-    (SUM(male_workers) + SUM(female_workers)) / SUM(population) * 100 as worker_percentage
-    FROM census_data JOIN districts ON census_data.District_code = districts.District_code GROUP BY district;
+    SELECT district, worker_percentage
+    FROM district_metrics JOIN districts ON district_metrics.District_code = districts.District_code
     """
-    return execute_query(query)
+    return run_report(query, 'district', grouped=False, **filters)
 
 
 # Define a function to get the households with LPG or PNG as cooking fuel for each district
-def get_households_with_lpg_png():
+def get_households_with_lpg_png(**filters):
     query = """
     SELECT district, SUM(LPG_or_PNG_Households) as households_with_lpg_png FROM household_data 
-    JOIN districts ON household_data.District_code = districts.District_code GROUP BY district;
+    JOIN districts ON household_data.District_code = districts.District_code
     """
-    return execute_query(query)
+    return run_report(query, 'district', **filters)
 
 # Define a function to get the religious composition for each district
-def get_religious_composition():
+def get_religious_composition(**filters):
     query = """
     SELECT district, SUM(hindus) as hindus, SUM(muslims) as muslims, SUM(christians) as christians, 
     SUM(sikhs) as sikhs, SUM(buddhists) as buddhists, SUM(jains) as jains, SUM(others_religions) as other_religions, SUM(religion_not_stated) as religion_not_stated 
-    FROM census_data JOIN districts ON census_data.District_code = districts.District_code GROUP BY district;
+    FROM census_data JOIN districts ON census_data.District_code = districts.District_code
     """
-    return execute_query(query)
+    return run_report(query, 'district', **filters)
 
 
 # Define a function to get the households with internet access for each district
-def get_households_with_internet():
+def get_households_with_internet(**filters):
     query = """
     SELECT district, SUM(households_with_internet) as households_with_internet 
-    FROM household_data JOIN districts ON household_data.District_code = districts.District_code GROUP BY district;
+    FROM household_data JOIN districts ON household_data.District_code = districts.District_code
     """
-    return execute_query(query)
+    return run_report(query, 'district', **filters)
 
 
 # Define a function to get the educational attainment distribution for each district
-def get_educational_attainment_distribution():
+def get_educational_attainment_distribution(**filters):
     query = """
     SELECT district, SUM(below_primary_education) as below_primary_education, SUM(primary_education) as primary_education, 
     SUM(middle_education) as middle_education, SUM(secondary_education) as secondary_education, SUM(higher_education) as higher_education, 
     SUM(graduate_education) as graduate_education, SUM(other_education) as other_education, SUM(literate_education) as literate_education,
     SUM(illiterate_education) as illiterate_education, SUM(total_education) as total_education
-    FROM census_data JOIN districts ON census_data.District_code = districts.District_code GROUP BY district;
+    FROM census_data JOIN districts ON census_data.District_code = districts.District_code
     """
-    return execute_query(query)
+    return run_report(query, 'district', **filters)
 
 
 # Define a function to get the households with access to various modes of transportation for each district
-def get_households_with_transportation_modes():
+def get_households_with_transportation_modes(**filters):
     query = """
     SELECT district, SUM(households_with_bicycle) as bicycle, SUM(households_with_car_jeep_van) as car, SUM(households_with_radio_transistor) as radio, 
     SUM(households_with_television) as television, SUM(households_with_scooter_motorcycle_moped) as bike
-    FROM household_data JOIN districts ON household_data.District_code = districts.District_code GROUP BY district;
+    FROM household_data JOIN districts ON household_data.District_code = districts.District_code
     """
-    return execute_query(query)
+    return run_report(query, 'district', **filters)
 
 
 # Define a function to get the condition of occupied census houses for each district
-def get_condition_of_census_houses():
+def get_condition_of_census_houses(**filters):
     query = """
     SELECT district, SUM(condition_of_occupied_census_houses_dilapidated_households) as dilapidated, SUM(households_with_separate_kitchen_cooking_inside_house) as separate_kitchen, 
     SUM(having_bathing_facility_total_households) as bathing_facility, SUM(having_latrine_facility_within_the_premises_total_households) as latrine_facility
-    FROM household_data JOIN districts ON household_data.District_code = districts.District_code GROUP BY district;
+    FROM household_data JOIN districts ON household_data.District_code = districts.District_code
     """
-    return execute_query(query)
+    return run_report(query, 'district', **filters)
 
 
 # Define a function to get the household size distribution for each district
-def get_household_size_distribution():
+def get_household_size_distribution(**filters):
     query = """
     SELECT district, SUM(household_size_1_person_households) as size_1_person, SUM(household_size_2_persons_households) as size_2_persons, 
     SUM(household_size_3_to_5_persons_households) as size_3_5_persons, SUM(household_size_6_8_persons_households) as size_6_8_persons, 
     SUM(household_size_9_persons_and_above_households) as size_9_persons_and_above
-    FROM household_data JOIN districts ON household_data.District_code = districts.District_code GROUP BY district;
+    FROM household_data JOIN districts ON household_data.District_code = districts.District_code
     """
-    return execute_query(query)
+    return run_report(query, 'district', **filters)
 
 
 # Define a function to get the total number of households in each state
-def get_total_households_in_each_state():
+def get_total_households_in_each_state(**filters):
     query = """
     SELECT State_or_UT, SUM(households) as total_households FROM household_data 
     JOIN districts ON household_data.District_code = districts.District_code
-    JOIN states ON states.state_id = districts.state_id GROUP BY State_or_UT;
+    JOIN states ON states.state_id = districts.state_id
     """
-    return execute_query(query)
+    return run_report(query, 'state', **filters)
 
 
 # Define a function to get the households with latrine facility within the premises for each state
-def get_households_with_latrine_facility_in_state():
+def get_households_with_latrine_facility_in_state(**filters):
     query = """
     SELECT State_or_UT, SUM(having_latrine_facility_within_the_premises_total_households) as households_with_latrine_facility
     FROM household_data JOIN districts ON household_data.District_code = districts.District_code
-    JOIN states ON states.state_id = districts.state_id GROUP BY State_or_UT;
+    JOIN states ON states.state_id = districts.state_id
     """
-    return execute_query(query)
+    return run_report(query, 'state', **filters)
 
 
 # Define a function to get the average household size for each state
-def get_average_household_size_in_state():
+def get_average_household_size_in_state(**filters):
     query = """
     SELECT State_or_UT, 
     AVG(household_size_2_persons_households) as size_2_persons_households,
@@ -765,46 +1543,46 @@ def get_average_household_size_in_state():
     AVG(household_size_6_8_persons_households) as size_6_8_persons_households,
     AVG(household_size_9_persons_and_above_households) as size_9_persons_and_above_households
     FROM household_data JOIN districts ON household_data.District_code = districts.District_code
-    JOIN states ON states.state_id = districts.state_id GROUP BY State_or_UT;
+    JOIN states ON states.state_id = districts.state_id
     """
-    return execute_query(query)
+    return run_report(query, 'state', **filters)
 
 
 # Define a function to get the number of owned vs rented households for each state
-def get_households_owned_vs_rented_in_state():
+def get_households_owned_vs_rented_in_state(**filters):
     query = """
     SELECT State_or_UT, SUM(ownership_owned_households) as owned_households, SUM(ownership_rented_households) as rented_households
     FROM household_data JOIN districts ON household_data.District_code = districts.District_code
-    JOIN states ON states.state_id = districts.state_id GROUP BY State_or_UT;
+    JOIN states ON states.state_id = districts.state_id
     """
-    return execute_query(query)
+    return run_report(query, 'state', **filters)
 
 
 # Define a function to get the types of latrine facilities for each state
-def get_types_of_latrine_facilities_in_state():
+def get_types_of_latrine_facilities_in_state(**filters):
     query = """
     SELECT State_or_UT, 
     SUM(type_of_latrine_facility_pit_latrine_households) as pit_latrine, SUM(latrine_flush_connected_other_system_households) as flush_latrine, 
     SUM(type_of_latrine_facility_other_latrine_households) as other_latrine, SUM(latrine_nightsoil_open_drain_households) as nightsoil_latrine,
     SUM(no_latrine_open_source_households) as no_latrine
     FROM household_data JOIN districts ON household_data.District_code = districts.District_code
-    JOIN states ON states.state_id = districts.state_id GROUP BY State_or_UT;
+    JOIN states ON states.state_id = districts.state_id
     """
-    return execute_query(query)
+    return run_report(query, 'state', **filters)
 
 
 # Define a function to get the households with nearby drinking water sources for each state
-def get_households_with_nearby_drinking_water():
+def get_households_with_nearby_drinking_water(**filters):
     query = """
     SELECT State_or_UT, SUM(drinking_water_handpump_tubewell_borewell_households) as households_with_nearby_drinking_water
     FROM household_data JOIN districts ON household_data.District_code = districts.District_code
-    JOIN states ON states.state_id = districts.state_id GROUP BY State_or_UT;
+    JOIN states ON states.state_id = districts.state_id
     """
-    return execute_query(query)
+    return run_report(query, 'state', **filters)
 
 
 # Define a function to get the average household income distribution for each state
-def get_average_household_income_distribution():
+def get_average_household_income_distribution(**filters):
     query = """
     SELECT State_or_UT,
     AVG(power_parity_less_than_rs_45000) AS avg_less_than_rs_45000,
@@ -820,106 +1598,325 @@ def get_average_household_income_distribution():
     AVG(power_parity_above_rs_545000) AS avg_above_rs_545000,
     AVG(total_power_parity) AS avg_total_power_parity
     FROM census_data JOIN districts ON census_data.District_code = districts.District_code
-    JOIN states ON states.state_id = districts.state_id GROUP BY State_or_UT;
+    JOIN states ON states.state_id = districts.state_id
     """
-    return execute_query(query)
+    return run_report(query, 'state', **filters)
 
 
 # Define a function to get the percentage of married couples with different household sizes for each state
-def get_percentage_of_married_couples_with_household_size():
+def get_percentage_of_married_couples_with_household_size(**filters):
     query = """
-    SELECT State_or_UT, (SUM(married_couples_1_households + married_couples_2_households + married_couples_3_households + married_couples_3_or_more_households 
-    + married_couples_4_households + married_couples_5_households) / SUM(households)) * 100 as percentage_married_couples
-    FROM household_data JOIN districts ON household_data.District_code = districts.District_code
-    JOIN states ON states.state_id = districts.state_id GROUP BY State_or_UT;
+    SELECT State_or_UT, percentage_married_couples
+    FROM state_metrics JOIN states ON states.state_id = state_metrics.state_id
     """
-    return execute_query(query)
+    return run_report(query, 'state', grouped=False, **filters)
 
 
 # Define a function to get the households below poverty line for each state
-def get_households_below_poverty_line():
+def get_households_below_poverty_line(**filters):
     query = """
     SELECT State_or_UT, SUM(power_parity_less_than_rs_45000) AS households_below_poverty_line
     FROM census_data JOIN districts ON census_data.District_code = districts.District_code
-    JOIN states ON states.state_id = districts.state_id GROUP BY State_or_UT;
+    JOIN states ON states.state_id = districts.state_id
     """
-    return execute_query(query)
+    return run_report(query, 'state', **filters)
 
 
 # Define a function to get the overall literacy rate for each state
-def get_overall_literacy_rate():
+def get_overall_literacy_rate(**filters):
     query = """
-    SELECT State_or_UT, 
-    (SUM(literate_education) / SUM(population)) * 100 as literacy_rate
-    FROM census_data JOIN districts ON census_data.District_code = districts.District_code
-    JOIN states ON states.state_id = districts.state_id GROUP BY State_or_UT;
+    SELECT State_or_UT, literacy_rate
+    FROM state_metrics JOIN states ON states.state_id = state_metrics.state_id
     """
-    return execute_query(query)
+    return run_report(query, 'state', grouped=False, **filters)
 
 
-# Define a function to display the dataframes in a Streamlit app
-def display_dataframes():
-    st.title('Census Data Analysis')
-    
-    st.subheader('Total Population of Each District')
-    st.dataframe(get_total_population())
-    
-    st.subheader('Literate Males and Females in Each District')
-    st.dataframe(get_literate_males_females())
-    
-    st.subheader('Worker Percentage in Each District')
-    st.dataframe(get_worker_percentage())
-    
-    st.subheader('Households with LPG or PNG as Cooking Fuel in Each District')
-    st.dataframe(get_households_with_lpg_png())
+# Define a function to get every derived rate and share for each district
+def get_derived_metrics(**filters):
+    query = f"""
+    SELECT district, {', '.join(DERIVED_METRICS)}
+    FROM district_metrics JOIN districts ON district_metrics.District_code = districts.District_code
+    """
+    return run_report(query, 'district', grouped=False, **filters)
+
+
+# Reports shown by display_dataframes as (title, query function) pairs
+REPORTS = [
+    ('Total Population of Each District', get_total_population),
+    ('Literate Males and Females in Each District', get_literate_males_females),
+    ('Worker Percentage in Each District', get_worker_percentage),
+    ('Households with LPG or PNG as Cooking Fuel in Each District', get_households_with_lpg_png),
+    ('Religious Composition of Each District', get_religious_composition),
+    ('Households with Internet Access in Each District', get_households_with_internet),
+    ('Educational Attainment Distribution in Each District', get_educational_attainment_distribution),
+    ('Households with Access to Various Modes of Transportation in Each District', get_households_with_transportation_modes),
+    ('Condition of Occupied Census Houses in Each District', get_condition_of_census_houses),
+    ('Household Size Distribution in Each District', get_household_size_distribution),
+    ('Total Number of Households in Each State', get_total_households_in_each_state),
+    ('Households with Latrine Facility within the Premises in Each State', get_households_with_latrine_facility_in_state),
+    ('Average Household Size in Each State', get_average_household_size_in_state),
+    ('Households Owned vs Rented in Each State', get_households_owned_vs_rented_in_state),
+    ('Types of Latrine Facilities in Each State', get_types_of_latrine_facilities_in_state),
+    ('Households with Drinking Water Sources Near the Premises in Each State', get_households_with_nearby_drinking_water),
+    ('Average Household Income Distribution in Each State', get_average_household_income_distribution),
+    ('Percentage of Married Couples with Different Household Sizes in Each State', get_percentage_of_married_couples_with_household_size),
+    ('Households Below Poverty Line in Each State', get_households_below_poverty_line),
+    ('Overall Literacy Rate in Each State', get_overall_literacy_rate),
+    ('Derived Rates and Shares in Each District', get_derived_metrics)
+]
+
+
+# Number of rows drawn in a report chart; larger reports are cut to the rows with the largest values
+CHART_ROWS = 20
+
+# Charts drawn below the report tables, as report function name -> (columns to plot, axis label). The first column
+# of the report labels the bars.
+REPORT_CHARTS = {
+    'get_total_population': (['total_population'], 'Population'),
+    'get_literate_males_females': (['literate_males', 'literate_females'], 'Literate people'),
+    'get_worker_percentage': (['worker_percentage'], 'Workers (%)'),
+    'get_total_households_in_each_state': (['total_households'], 'Households'),
+    'get_households_owned_vs_rented_in_state': (['owned_households', 'rented_households'], 'Households'),
+    'get_households_below_poverty_line': (['households_below_poverty_line'], 'Households'),
+    'get_overall_literacy_rate': (['literacy_rate'], 'Literacy rate (%)')
+}
+
+
+# Define a function to prepare a report table for its chart
+def get_chart_data(table, columns, rows=CHART_ROWS):
+    df = table.to_pandas() if hasattr(table, 'to_pandas') else table
+    # MySQL returns sums as DECIMAL, which arrive as object columns that cannot be ranked or plotted
+    df = df.set_index(df.columns[0])[columns].astype('float64')
+
+    # Keep the largest rows, with the largest drawn at the top of the chart
+    return df.nlargest(rows, columns[0]).iloc[::-1]
+
+
+# Task 7a: Run the Same Reports in MongoDB with Aggregation Pipelines
+
+# Names of the grouping key columns, matching the MySQL report output
+MONGODB_KEY_NAMES = {'District': 'district', 'State/UT': 'State_or_UT'}
+
+# The REPORTS as (grouping field, {output column: measure}) pairs over the 'census' collection, keyed by the
+# name of the MySQL function. A measure is ('sum', field), ('avg', field), ('value', field) for a field stored once
+# per district such as a derived metric, or ('percentage', numerator fields, denominator field) for
+# SUM(numerator) / SUM(denominator) * 100. Missing counts are 0, as in the MySQL load.
+MONGODB_REPORTS = {
+    'get_total_population': ('District', {'total_population': ('sum', 'Population')}),
+    'get_literate_males_females': ('District', {
+        'literate_males': ('sum', 'Literate_Male'), 'literate_females': ('sum', 'Literate_Female')
+    }),
+    'get_worker_percentage': ('District', {'worker_percentage': ('value', 'worker_percentage')}),
+    'get_households_with_lpg_png': ('District', {'households_with_lpg_png': ('sum', 'LPG_or_PNG_Households')}),
+    'get_religious_composition': ('District', {
+        'hindus': ('sum', 'Hindus'), 'muslims': ('sum', 'Muslims'), 'christians': ('sum', 'Christians'),
+        'sikhs': ('sum', 'Sikhs'), 'buddhists': ('sum', 'Buddhists'), 'jains': ('sum', 'Jains'),
+        'other_religions': ('sum', 'Others_Religions'), 'religion_not_stated': ('sum', 'Religion_Not_Stated')
+    }),
+    'get_households_with_internet': ('District', {'households_with_internet': ('sum', 'Households_with_Internet')}),
+    'get_educational_attainment_distribution': ('District', {
+        'below_primary_education': ('sum', 'Below_Primary_Education'),
+        'primary_education': ('sum', 'Primary_Education'),
+        'middle_education': ('sum', 'Middle_Education'),
+        'secondary_education': ('sum', 'Secondary_Education'),
+        'higher_education': ('sum', 'Higher_Education'),
+        'graduate_education': ('sum', 'Graduate_Education'),
+        'other_education': ('sum', 'Other_Education'),
+        'literate_education': ('sum', 'Literate_Education'),
+        'illiterate_education': ('sum', 'Illiterate_Education'),
+        'total_education': ('sum', 'Total_Education')
+    }),
+    'get_households_with_transportation_modes': ('District', {
+        'bicycle': ('sum', 'Households_with_Bicycle'), 'car': ('sum', 'Households_with_Car_Jeep_Van'),
+        'radio': ('sum', 'Households_with_Radio_Transistor'), 'television': ('sum', 'Households_with_Television'),
+        'bike': ('sum', 'Households_with_Scooter_Motorcycle_Moped')
+    }),
+    'get_condition_of_census_houses': ('District', {
+        'dilapidated': ('sum', 'Condition_of_occupied_census_houses_Dilapidated_Households'),
+        'separate_kitchen': ('sum', 'Households_with_separate_kitchen_Cooking_inside_house'),
+        'bathing_facility': ('sum', 'Having_bathing_facility_Total_Households'),
+        'latrine_facility': ('sum', 'Having_latrine_facility_within_the_premises_Total_Households')
+    }),
+    'get_household_size_distribution': ('District', {
+        'size_1_person': ('sum', 'Household_size_1_person_Households'),
+        'size_2_persons': ('sum', 'Household_size_2_persons_Households'),
+        'size_3_5_persons': ('sum', 'Household_size_3_to_5_persons_Households'),
+        'size_6_8_persons': ('sum', 'Household_size_6_8_persons_Households'),
+        'size_9_persons_and_above': ('sum', 'Household_size_9_persons_and_above_Households')
+    }),
+    'get_total_households_in_each_state': ('State/UT', {'total_households': ('sum', 'Households')}),
+    'get_households_with_latrine_facility_in_state': ('State/UT', {
+        'households_with_latrine_facility': ('sum', 'Having_latrine_facility_within_the_premises_Total_Households')
+    }),
+    'get_average_household_size_in_state': ('State/UT', {
+        'size_2_persons_households': ('avg', 'Household_size_2_persons_Households'),
+        'size_1_to_2_persons_households': ('avg', 'Household_size_1_to_2_persons'),
+        'size_3_persons_households': ('avg', 'Household_size_3_persons_Households'),
+        'size_3_to_5_persons_households': ('avg', 'Household_size_3_to_5_persons_Households'),
+        'size_4_persons_households': ('avg', 'Household_size_4_persons_Households'),
+        'size_5_persons_households': ('avg', 'Household_size_5_persons_Households'),
+        'size_6_8_persons_households': ('avg', 'Household_size_6_8_persons_Households'),
+        'size_9_persons_and_above_households': ('avg', 'Household_size_9_persons_and_above_Households')
+    }),
+    'get_households_owned_vs_rented_in_state': ('State/UT', {
+        'owned_households': ('sum', 'Ownership_Owned_Households'),
+        'rented_households': ('sum', 'Ownership_Rented_Households')
+    }),
+    'get_types_of_latrine_facilities_in_state': ('State/UT', {
+        'pit_latrine': ('sum', 'Type_of_latrine_facility_Pit_latrine_Households'),
+        'flush_latrine': ('sum', 'Latrine_Flush_Connected_Other_System_Households'),
+        'other_latrine': ('sum', 'Type_of_latrine_facility_Other_latrine_Households'),
+        'nightsoil_latrine': ('sum', 'Latrine_Nightsoil_Open_Drain_Households'),
+        'no_latrine': ('sum', 'No_Latrine_Open_Source_Households')
+    }),
+    'get_households_with_nearby_drinking_water': ('State/UT', {
+        'households_with_nearby_drinking_water': ('sum', 'Drinking_Water_Handpump_Tubewell_Borewell_Households')
+    }),
+    'get_average_household_income_distribution': ('State/UT', {
+        'avg_less_than_rs_45000': ('avg', 'Power_Parity_Less_than_Rs_45000'),
+        'avg_rs_45000_90000': ('avg', 'Power_Parity_Rs_45000_90000'),
+        'avg_rs_90000_150000': ('avg', 'Power_Parity_Rs_90000_150000'),
+        'avg_rs_45000_150000': ('avg', 'Power_Parity_Rs_45000_150000'),
+        'avg_rs_150000_240000': ('avg', 'Power_Parity_Rs_150000_240000'),
+        'avg_rs_240000_330000': ('avg', 'Power_Parity_Rs_240000_330000'),
+        'avg_rs_150000_330000': ('avg', 'Power_Parity_Rs_150000_330000'),
+        'avg_rs_330000_425000': ('avg', 'Power_Parity_Rs_330000_425000'),
+        'avg_rs_425000_545000': ('avg', 'Power_Parity_Rs_425000_545000'),
+        'avg_rs_330000_545000': ('avg', 'Power_Parity_Rs_330000_545000'),
+        'avg_above_rs_545000': ('avg', 'Power_Parity_Above_Rs_545000'),
+        'avg_total_power_parity': ('avg', 'Total_Power_Parity')
+    }),
+    'get_percentage_of_married_couples_with_household_size': ('State/UT', {
+        'percentage_married_couples': ('percentage', [
+            'Married_couples_1_Households', 'Married_couples_2_Households', 'Married_couples_3_Households',
+            'Married_couples_3_or_more_Households', 'Married_couples_4_Households', 'Married_couples_5__Households'
+        ], 'Households')
+    }),
+    'get_households_below_poverty_line': ('State/UT', {
+        'households_below_poverty_line': ('sum', 'Power_Parity_Less_than_Rs_45000')
+    }),
+    'get_overall_literacy_rate': ('State/UT', {
+        'literacy_rate': ('percentage', ['Literate_Education'], 'Population')
+    }),
+    'get_derived_metrics': ('District', {name: ('value', name) for name in DERIVED_METRICS})
+}
+
+
+# Define a function to build the $group aggregation pipeline of a MongoDB report
+def build_mongodb_pipeline(key, measures, states=None, districts=None, order_by=None, descending=False, limit=None):
+    # District names repeat across states, so districts are grouped by their code and keep their name
+    if key == 'District':
+        group = {'_id': '$District_code', 'District': {'$first': '$District'}}
+        project = {'_id': 0, MONGODB_KEY_NAMES[key]: '$District'}
+        sort = {'District': 1, '_id': 1}
+    else:
+        group = {'_id': f'${key}'}
+        project = {'_id': 0, MONGODB_KEY_NAMES[key]: '$_id'}
+        sort = {'_id': 1}
+
+    for name, (accumulator, *fields) in measures.items():
+        if accumulator == 'percentage':
+            # Sum the numerator and denominator on the server, then divide once per group (NULL when dividing by 0)
+            numerator, denominator = fields
+            group[f'{name}_numerator'] = {'$sum': {'$add': [{'$ifNull': [f'${field}', 0]} for field in numerator]}}
+            group[f'{name}_denominator'] = {'$sum': {'$ifNull': [f'${denominator}', 0]}}
+            project[name] = {'$cond': [
+                {'$eq': [f'${name}_denominator', 0]},
+                None,
+                {'$multiply': [{'$divide': [f'${name}_numerator', f'${name}_denominator']}, 100]}
+            ]}
+        elif accumulator == 'value':
+            # Derived metrics are stored in each district document; missing ones stay null
+            group[name] = {'$first': f'${fields[0]}'}
+            project[name] = 1
+        else:
+            group[name] = {f'${accumulator}': {'$ifNull': [f'${fields[0]}', 0]}}
+            project[name] = 1
+
+    # Filter on the indexed fields before grouping, so that only the matching documents are read
+    match = {}
+    if states:
+        match['State/UT'] = {'$in': list(states)}
+    if districts:
+        match['District'] = {'$in': list(districts)}
+
+    pipeline = [{'$match': match}] if match else []
+    pipeline += [{'$group': group}, {'$sort': sort}, {'$project': project}]
+    if order_by:
+        pipeline.append({'$sort': {order_by: -1 if descending else 1}})
+    if limit is not None:
+        pipeline.append({'$limit': int(limit)})
+    return pipeline
+
+
+# Define a function to run a report in MongoDB and return the result as a pyarrow Table; the filters are the
+# same as those of run_report
+def run_mongodb_report(name, **filters):
+    key, measures = MONGODB_REPORTS[name]
+
+    # Create a connection to the MongoDB server running on localhost at the default port 27017
+    client = pymongo.MongoClient("mongodb://localhost:27017/")
+    try:
+        # Only the aggregated groups come back from the server
+        documents = list(client["census_db"]["census"].aggregate(build_mongodb_pipeline(key, measures, **filters)))
+    finally:
+        # Close the connection to the MongoDB server
+        client.close()
 
-    st.subheader('Religious Composition of Each District')
-    st.dataframe(get_religious_composition())
+    # Build Arrow columns in the same order as the MySQL report
+    names = [MONGODB_KEY_NAMES[key]] + list(measures)
+    return pa.Table.from_arrays([pa.array([document.get(name) for document in documents]) for name in names], names=names)
 
-    st.subheader('Households with Internet Access in Each District')
-    st.dataframe(get_households_with_internet())
 
-    st.subheader('Educational Attainment Distribution in Each District')
-    st.dataframe(get_educational_attainment_distribution())
-    
-    st.subheader('Households with Access to Various Modes of Transportation in Each District')
-    st.dataframe(get_households_with_transportation_modes())
+# Define a function to list the tasks that produce the REPORTS from the given source, with the filters of
+# run_report applied on the server (the published files are always complete)
+def get_report_tasks(source='mysql', directory=None, **filters):
+    # Map the published Arrow files
+    if source == 'published':
+        return [lambda function=function: load_published_report(function, directory) for _, function in REPORTS]
 
-    st.subheader('Condition of Occupied Census Houses in Each District')
-    st.dataframe(get_condition_of_census_houses())
+    # Aggregate in MongoDB
+    if source == 'mongodb':
+        return [lambda function=function: run_mongodb_report(function.__name__, **filters) for _, function in REPORTS]
 
-    st.subheader('Household Size Distribution in Each District')
-    st.dataframe(get_household_size_distribution())
+    # Query MySQL
+    return [lambda function=function: function(**filters) for _, function in REPORTS]
 
-    st.subheader('Total Number of Households in Each State')
-    st.dataframe(get_total_households_in_each_state())
-    
-    st.subheader('Households with Latrine Facility within the Premises in Each State')
-    st.dataframe(get_households_with_latrine_facility_in_state())
 
-    st.subheader('Average Household Size in Each State')
-    st.dataframe(get_average_household_size_in_state())
+# Define a function to display the dataframes in a Streamlit app
+def display_dataframes(workers=1, source='mysql', directory=None, **filters):
+    reporter.title('Census Data Analysis')
 
-    st.subheader('Households Owned vs Rented in Each State')
-    st.dataframe(get_households_owned_vs_rented_in_state())
+    # Run the report tasks, concurrently when more than one worker is allowed, and display them in order.
+    # Streamlit runs every rerun on a new thread, so the connection opened on this one is closed afterwards.
+    try:
+        results = run_parallel(get_report_tasks(source, directory, **filters), workers)
+    finally:
+        close_report_connection()
+    for (title, function), result in zip(REPORTS, results):
+        reporter.subheader(title)
+        reporter.dataframe(result)
 
-    st.subheader('Types of Latrine Facilities in Each State')
-    st.dataframe(get_types_of_latrine_facilities_in_state())
-    
-    st.subheader('Households with Drinking Water Sources Near the Premises in Each State')
-    st.dataframe(get_households_with_nearby_drinking_water())
+        # Draw a chart for the reports that have one; rendered charts are cached by their data
+        if reporter.draws_charts and function.__name__ in REPORT_CHARTS:
+            columns, xlabel = REPORT_CHARTS[function.__name__]
+            reporter.bar_chart(get_chart_data(result, columns), xlabel=xlabel)
 
-    st.subheader('Average Household Income Distribution in Each State')
-    st.dataframe(get_average_household_income_distribution())
 
-    st.subheader('Percentage of Married Couples with Different Household Sizes in Each State')
-    st.dataframe(get_percentage_of_married_couples_with_household_size())
+# Define a function to run independent tasks, on a thread pool when more than one worker is allowed
+def run_parallel(tasks, workers=1):
+    if workers <= 1:
+        return [task() for task in tasks]
 
-    st.subheader('Households Below Poverty Line in Each State')
-    st.dataframe(get_households_below_poverty_line())
+    # The pool threads end with the call, so each closes the report connection it opened
+    def run(task):
+        try:
+            return task()
+        finally:
+            close_report_connection()
 
-    st.subheader('Overall Literacy Rate in Each State')
-    st.dataframe(get_overall_literacy_rate())
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, tasks))
 
 
 # Define a function to load census data from an Excel file
@@ -927,36 +1924,185 @@ def load_census_data(file_path):
     df = pd.read_excel(file_path)
     return df
 
-# Main function
-if __name__ == '__main__':
+# Task 8: Publish the Cleaned Data and Reports as Memory-Mapped Arrow Files
+
+# Directory the publish stage writes to and dashboard processes map the data from
+PUBLISHED_DIR = 'census_arrow'
+
+# Define a function to write a pyarrow Table to an Arrow IPC file
+def write_arrow_file(table, path):
+    # Write to a temporary file and rename it, so readers never map a half-written file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(temp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temp_path, path)
+
+
+# Define a function to map an Arrow IPC file read-only
+def read_arrow_file(path):
+    # The returned Table points into the mapped pages, which every process shares through the page cache
+    source = pa.memory_map(path, 'r')
+    return pa.ipc.open_file(source).read_all()
+
+
+# Define a function to publish the cleaned census data and every report table
+def publish_dataset(df, directory=None, workers=1, source='mysql'):
+    directory = directory or PUBLISHED_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    # Publish the cleaned census data, which report_service.py serves at /census
+    write_arrow_file(pa.Table.from_pandas(df, preserve_index=False), os.path.join(directory, 'census.arrow'))
+
+    # Run the reports once, in MySQL or MongoDB, and publish each result under the name of its function
+    results = run_parallel(get_report_tasks(source), workers)
+    for (_, function), result in zip(REPORTS, results):
+        write_arrow_file(result, os.path.join(directory, f"{function.__name__}.arrow"))
+
+
+# Define a function to map the published census data
+def load_published_census(directory=None):
+    return read_arrow_file(os.path.join(directory or PUBLISHED_DIR, 'census.arrow'))
+
+
+# Define a function to map a published report table
+def load_published_report(function, directory=None):
+    return read_arrow_file(os.path.join(directory or PUBLISHED_DIR, f"{function.__name__}.arrow"))
+
+
+# Task 9: Pipeline stages
+
+# Stages that can be selected on the command line, in the order they run
+STAGES = ['clean', 'load', 'reconcile', 'publish', 'report']
+
+# Stages run when none are selected; reconciling queries every store and publishing rewrites the Arrow files, so
+# both only run when asked for
+DEFAULT_STAGES = ['clean', 'load', 'report']
+
+# Define a function to load, clean and validate the census data
+def run_cleaning_stage(file_path):
     # Load the census data from the specified Excel file
-    df = load_census_data('census_2011.xlsx')
-    
+    df = load_census_data(file_path)
+
     # Process the data with various functions for cleaning and handling the missing data
     df = rename_columns(df)
     df = rename_states(df)
     df = handle_new_states(df)
     df = handle_missing_data(df)
-    
+
+    # Split rows that fail validation into a reject table so that the loaders only see clean rows
+    df, rejects = validate_data(df)
+    report_rejects(rejects)
+
+    # Compute the rates and shares of every district once, so that both sinks store them as columns
+    df = add_derived_metrics(df)
+
+    return df
+
+
+# Define a function to save the cleaned data to MongoDB
+def load_to_mongodb(df):
     # Save the processed data to MongoDB
     save_to_mongodb(df)
-    
+
     # Fetch data from MongoDB
     fetch_from_mongodb()
-    
-    # Read database credentials from a file
-    read_db_credentials('db_credentials.txt')
-    
-    # Create MySQL tables    
+
+
+# Define a function to upload the cleaned data to the MySQL tables
+def load_to_mysql(df, workers=1, resume=False, batch_size=BATCH_SIZE, rebuild_schema=False):
+    # Drop the tables of an older schema first when asked to
+    if rebuild_schema:
+        drop_mysql_tables()
+
+    # Create MySQL tables
     create_mysql_tables()
-    
-    # Upload data to MySQL tables
+
+    # Upload data to the dimension tables
     upload_to_states_table(df)
     upload_to_districts_table(df)
-    upload_to_census_data_table(df)
-    upload_to_household_data_table(df)
-    
-    # Display the dataframes using Streamlit
-    display_dataframes()
 
+    # Check foreign-key presence against the loaded States and Districts before loading the fact tables
+    district_codes, state_ids = fetch_reference_keys()
+    df, fk_rejects = validate_data(df, district_codes, state_ids)
+    report_rejects(fk_rejects)
+
+    # Upload data to the fact and metrics tables, which do not depend on each other
+    run_parallel([
+        lambda: upload_to_census_data_table(df, resume, batch_size),
+        lambda: upload_to_household_data_table(df, resume, batch_size),
+        lambda: upload_to_metrics_tables(df)
+    ], workers)
+
+
+# Define a function to load the cleaned data into the selected sinks
+def run_load_stage(df, sink='all', workers=1, resume=False, batch_size=BATCH_SIZE, rebuild_schema=False):
+    tasks = []
+    if sink in ('mongodb', 'all'):
+        tasks.append(lambda: load_to_mongodb(df))
+    if sink in ('mysql', 'all'):
+        tasks.append(lambda: load_to_mysql(df, workers, resume, batch_size, rebuild_schema))
+    run_parallel(tasks, workers)
+
+
+# Main function
+if __name__ == '__main__':
+    # Parse the command line options
+    parser = argparse.ArgumentParser(description='Census data standardization and analysis pipeline')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=DEFAULT_STAGES,
+                        help='stages to run (all but reconcile and publish by default); the load, reconcile and publish stages '
+                             'run the cleaning stage first')
+    parser.add_argument('--sink', choices=['mongodb', 'mysql', 'all'], default='all',
+                        help='databases the load stage writes to and the reconcile stage checks')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='threads used to run independent loads and report queries')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue the fact table loads from the last committed batch')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help='rows per transaction when loading the fact tables')
+    parser.add_argument('--rebuild-schema', action='store_true',
+                        help='drop and recreate the MySQL tables before loading, to move to the current schema')
+    parser.add_argument('--reporter', choices=['auto', 'streamlit', 'console'], default='auto',
+                        help='where output goes; auto uses Streamlit when launched with streamlit run')
+    parser.add_argument('--source', choices=['mysql', 'mongodb', 'published'], default='mysql',
+                        help='where the report stage reads the report tables from; the publish stage runs '
+                             'the reports in MongoDB when this is mongodb and in MySQL otherwise')
+    parser.add_argument('--published-dir', default=PUBLISHED_DIR,
+                        help='directory of the Arrow files written by the publish stage')
+    parser.add_argument('--states', nargs='+',
+                        help='only report these State/UT names; filtered on the server for mysql and mongodb')
+    parser.add_argument('--limit', type=int,
+                        help='return at most this many rows per report; applied on the server for mysql and mongodb')
+    args = parser.parse_args()
+
+    # The published reports are complete tables and cannot be filtered, as in report_service.py
+    if 'report' in args.stages and args.source == 'published' and (args.states or args.limit is not None):
+        parser.error("--states and --limit cannot be used with --source published")
+
+    # Send the output to Streamlit only when the script runs inside it, so headless runs never import it
+    if args.reporter == 'streamlit' or (args.reporter == 'auto' and 'streamlit' in sys.modules):
+        reporter = StreamlitReporter()
+
+    # Read database credentials from a file
+    if (('publish' in args.stages and args.source != 'mongodb') or ('report' in args.stages and args.source == 'mysql')
+            or (('load' in args.stages or 'reconcile' in args.stages) and args.sink != 'mongodb')):
+        read_db_credentials('db_credentials.txt')
 
+    # Clean the data, then upload it to the selected databases
+    if {'clean', 'load', 'reconcile', 'publish'} & set(args.stages):
+        df = run_cleaning_stage('census_2011.xlsx')
+    if 'load' in args.stages:
+        run_load_stage(df, args.sink, args.workers, args.resume, args.batch_size, args.rebuild_schema)
+
+    # Check that the stores agree with the cleaned data by comparing per-state summaries
+    if 'reconcile' in args.stages:
+        stores = ['mysql', 'mongodb'] if args.sink == 'all' else [args.sink]
+        report_reconciliation(reconcile_stores(df, stores))
+
+    # Publish the cleaned data and the report tables for the dashboard processes to map
+    if 'publish' in args.stages:
+        publish_dataset(df, args.published_dir, args.workers, 'mongodb' if args.source == 'mongodb' else 'mysql')
+
+    # Display the dataframes using Streamlit
+    if 'report' in args.stages:
+        display_dataframes(args.workers, args.source, args.published_dir, states=args.states, limit=args.limit)
@@ -0,0 +1,121 @@
+# EXPLAIN-plan and timing check for the dashboard report queries
+#
+# Runs EXPLAIN on the SQL of every get_* report in census.py, flags joins that scan a table instead of using an
+# index, and times each query. Save a run with --save before applying a schema change (for example
+# `python census.py --stages load --sink mysql --rebuild-schema`), then run again with --compare to see the
+# before and after timings side by side. Reports that read tables the old schema does not have yet (the metrics
+# tables) are recorded with their error and left out of the comparison.
+
+# Import necessary libraries
+import argparse
+import json
+import statistics
+import time
+
+import census
+
+
+# Define a function to get the SQL a report function sends to execute_query, without running it
+def capture_query(function):
+    captured = []
+    execute_query = census.execute_query
+    census.execute_query = lambda query, params=(): captured.append(query)
+    try:
+        function()
+    finally:
+        census.execute_query = execute_query
+    return captured[0]
+
+
+# Define a function to explain a query and flag the plan rows that do not use an index
+def explain_query(cursor, query):
+    cursor.execute(f"EXPLAIN {query}")
+    plan = cursor.fetchall()
+    for position, row in enumerate(plan):
+        issues = []
+        # Every table after the first is joined; a join should look rows up by key instead of scanning
+        if position > 0 and row['type'] in ('ALL', 'index'):
+            issues.append('join scans the table')
+        if row['key'] is None and row['type'] != 'ALL':
+            issues.append('no index used')
+        if 'Using join buffer' in (row['Extra'] or ''):
+            issues.append('join buffer')
+        row['issues'] = ', '.join(issues)
+    return plan
+
+
+# Define a function to time a query, returning the median of several runs in milliseconds
+def time_query(cursor, query, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+# Define a function to explain and time every report query
+def check_reports(repeat=5):
+    db_connection = census.connect_to_census_db()
+    cursor = db_connection.cursor(dictionary=True)
+
+    results = {}
+    for _, function in census.REPORTS:
+        query = capture_query(function)
+        try:
+            results[function.__name__] = {
+                'plan': explain_query(cursor, query),
+                'median_ms': time_query(cursor, query, repeat)
+            }
+        except census.mysql.connector.Error as e:
+            # Record the failure and carry on, so that one missing table does not stop the whole run
+            results[function.__name__] = {'plan': [], 'median_ms': None, 'error': str(e)}
+
+    # Close the cursor and the connection
+    cursor.close()
+    db_connection.close()
+
+    return results
+
+
+# Main function
+if __name__ == '__main__':
+    # Parse the command line options
+    parser = argparse.ArgumentParser(description='Check the EXPLAIN plans and timings of the report queries')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per query; the median is reported')
+    parser.add_argument('--save', help='write the plans and timings to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run to show before and after timings against')
+    args = parser.parse_args()
+
+    # Read database credentials from a file
+    census.read_db_credentials('db_credentials.txt')
+    results = check_reports(args.repeat)
+
+    # Print the plan of every report, with the rows that need attention flagged
+    pd = census.pd
+    pd.set_option('display.width', 200)
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"\n{name} (failed: {result['error']})")
+            continue
+        print(f"\n{name} ({result['median_ms']:.2f} ms)")
+        plan = pd.DataFrame(result['plan'])
+        print(plan[[column for column in ('table', 'type', 'key', 'rows', 'Extra', 'issues') if column in plan]].to_string())
+
+    # Show the before and after timings
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            before = json.load(file)
+        # Reports that failed in either run have no timing to compare
+        timings = pd.DataFrame({
+            'before_ms': {name: result['median_ms'] for name, result in before.items()},
+            'after_ms': {name: result['median_ms'] for name, result in results.items()}
+        }, dtype='float64')
+        timings['speedup'] = timings['before_ms'] / timings['after_ms']
+        print()
+        print(timings.round(2).to_string())
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2, default=str)
@@ -0,0 +1,230 @@
+# Load-test harness for the dashboard report queries
+#
+# Simulates concurrent dashboard sessions, each running the full set of get_* reports shown by
+# display_dataframes, and reports latency percentiles, throughput and error rates per report and the
+# connections opened per session. By default the queries run against a local SQLite stand-in built from census_2011.xlsx,
+# so no MySQL server is needed; use --target mysql to measure the real database instead.
+
+# Import necessary libraries
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import census
+
+
+# Define a function to build a SQLite copy of the census_db star schema from the cleaned census data
+def build_sqlite_stand_in(path, file_path='census_2011.xlsx'):
+    # Run the cleaning stage without printing its output
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        df = census.run_cleaning_stage(file_path)
+    df = df.fillna(value=0)
+
+    db_connection = sqlite3.connect(path)
+    cursor = db_connection.cursor()
+
+    # Create the tables with the same table and column names as create_mysql_tables
+    census_columns = ['District_code'] + [column for column, _ in census.CENSUS_DATA_COLUMNS]
+    household_columns = ['District_code'] + [column for column, _ in census.HOUSEHOLD_DATA_COLUMNS]
+    cursor.execute("CREATE TABLE States (state_id INTEGER PRIMARY KEY, State_or_UT TEXT UNIQUE NOT NULL)")
+    cursor.execute("CREATE TABLE Districts (District_code INTEGER PRIMARY KEY, District TEXT NOT NULL, state_id INTEGER)")
+    cursor.execute(f"CREATE TABLE Census_Data ({', '.join(column + ' INTEGER' for column in census_columns)})")
+    cursor.execute(f"CREATE TABLE Household_Data ({', '.join(column + ' INTEGER' for column in household_columns)})")
+
+    # Load the dimension tables
+    states = list(df['State/UT'].drop_duplicates())
+    state_ids = {state: state_id for state_id, state in enumerate(states, start=1)}
+    cursor.executemany("INSERT INTO States VALUES (?, ?)", [(state_id, state) for state, state_id in state_ids.items()])
+    cursor.executemany("INSERT INTO Districts VALUES (?, ?, ?)", [
+        (int(code), district, state_ids[state])
+        for code, district, state in df[['District_code', 'District', 'State/UT']].itertuples(index=False)
+    ])
+
+    # Load the fact tables
+    for table, columns in (('Census_Data', census.CENSUS_DATA_COLUMNS), ('Household_Data', census.HOUSEHOLD_DATA_COLUMNS)):
+        rows = df[['District_code'] + [column for _, column in columns]].astype('int64').values.tolist()
+        cursor.executemany(f"INSERT INTO {table} VALUES ({', '.join(['?'] * (len(columns) + 1))})", rows)
+
+    # Load the metrics tables
+    metrics = list(census.DERIVED_METRICS)
+    state_metrics = census.compute_state_metrics(df)
+    for table, key, keys, values in (
+        ('District_Metrics', 'District_code', df['District_code'].astype('int64'), df[metrics]),
+        ('State_Metrics', 'state_id', state_metrics.index.map(state_ids), state_metrics)
+    ):
+        cursor.execute(f"CREATE TABLE {table} ({key} INTEGER PRIMARY KEY, {', '.join(name + ' REAL' for name in metrics)})")
+        rows = [[int(key_value)] + row for key_value, row in zip(keys, values.astype(object).where(values.notna(), None).values.tolist())]
+        cursor.executemany(f"INSERT INTO {table} VALUES ({', '.join(['?'] * (len(metrics) + 1))})", rows)
+
+    db_connection.commit()
+    db_connection.close()
+
+
+# SQLite connection that accepts the MySQL-style prepared cursors and %s placeholders that execute_query uses
+class SQLiteConnection:
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, prepared=False):
+        return SQLiteCursor(self._connection.cursor())
+
+    def __getattr__(self, attr):
+        return getattr(self._connection, attr)
+
+
+# SQLite cursor that translates %s placeholders to ?
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        return self._cursor.execute(query.replace('%s', '?'), params)
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+
+# Connection that reports back to its ConnectionCounter when it is closed
+class CountedConnection:
+    def __init__(self, connection, counter):
+        self._connection = connection
+        self._counter = counter
+
+    def close(self):
+        self._connection.close()
+        self._counter.release()
+
+    def __getattr__(self, attr):
+        return getattr(self._connection, attr)
+
+
+# Connection factory that counts opened, currently open and peak concurrent connections
+class ConnectionCounter:
+    def __init__(self, connect):
+        self._connect = connect
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.open = 0
+        self.peak = 0
+
+    def __call__(self):
+        connection = self._connect()
+        with self._lock:
+            self.opened += 1
+            self.open += 1
+            self.peak = max(self.peak, self.open)
+        return CountedConnection(connection, self)
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+# Define a function to run one simulated dashboard session
+def run_session(barrier, iterations, think_time, results):
+    # Start every session at the same moment
+    barrier.wait()
+
+    # execute_query reuses one connection per session thread, which is closed when the session ends
+    try:
+        run_reports(iterations, think_time, results)
+    finally:
+        census.close_report_connection()
+
+
+# Define a function to run the full report set the given number of times, recording each query
+def run_reports(iterations, think_time, results):
+    for _ in range(iterations):
+        for _, function in census.REPORTS:
+            start = time.perf_counter()
+            try:
+                function()
+                error = False
+            except Exception:
+                error = True
+            results.append((function.__name__, time.perf_counter() - start, error))
+
+            # Pause between reports like an analyst scrolling through the page
+            if think_time:
+                time.sleep(think_time)
+
+
+# Define a function to run the load test and summarise it per report
+def run_load_test(sessions, iterations=1, think_time=0.0):
+    pd = census.pd
+
+    # Route every report query through the counting connection factory
+    counter = ConnectionCounter(census.connect_to_census_db)
+    census.connect_to_census_db = counter
+
+    results = []
+    barrier = threading.Barrier(sessions)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        futures = [executor.submit(run_session, barrier, iterations, think_time, results)
+                   for _ in range(sessions)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    # Aggregate the latency samples per report, in milliseconds
+    frame = pd.DataFrame(results, columns=['report', 'latency', 'error'])
+    frame['latency'] *= 1000
+    grouped = frame.groupby('report', sort=False)
+    summary = pd.DataFrame({
+        'queries': grouped.size(),
+        'p50_ms': grouped['latency'].quantile(0.50),
+        'p95_ms': grouped['latency'].quantile(0.95),
+        'p99_ms': grouped['latency'].quantile(0.99),
+        'throughput_qps': grouped.size() / elapsed,
+        'error_rate': grouped['error'].mean()
+    }).loc[frame['report'].unique()]
+
+    totals = {
+        'sessions': sessions,
+        'queries': len(frame),
+        'elapsed_s': elapsed,
+        'throughput_qps': len(frame) / elapsed,
+        'connections_opened': counter.opened,
+        'connections_per_session': counter.opened / sessions,
+        'peak_open_connections': counter.peak,
+        'connections_left_open': counter.open,
+        'error_rate': frame['error'].mean()
+    }
+    return summary, totals
+
+
+# Main function
+if __name__ == '__main__':
+    # Parse the command line options
+    parser = argparse.ArgumentParser(description='Concurrent-session load test for the census dashboard queries')
+    parser.add_argument('--sessions', type=int, default=50, help='number of concurrent dashboard sessions')
+    parser.add_argument('--iterations', type=int, default=1, help='times each session runs the full report set')
+    parser.add_argument('--think-time', type=float, default=0.0, help='seconds each session waits between reports')
+    parser.add_argument('--target', choices=['sqlite', 'mysql'], default='sqlite',
+                        help='run against a local SQLite stand-in or the MySQL census_db database')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.target == 'sqlite':
+            # Build the stand-in once; execute_query opens one connection to it per session thread
+            path = os.path.join(directory, 'census_db.sqlite')
+            build_sqlite_stand_in(path)
+            census.connect_to_census_db = lambda: SQLiteConnection(path)
+        else:
+            # Read database credentials from a file
+            census.read_db_credentials('db_credentials.txt')
+
+        summary, totals = run_load_test(args.sessions, args.iterations, args.think_time)
+
+    census.pd.set_option('display.width', 200)
+    print(summary.round(3).to_string())
+    print()
+    for name, value in totals.items():
+        print(f"{name}: {round(value, 3)}")
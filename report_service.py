@@ -0,0 +1,351 @@
+# Local HTTP/JSON service for the census reports
+#
+# Serves every get_* report shown by display_dataframes as JSON for other services:
+#   GET /reports                 lists the reports
+#   GET /reports/<name>          returns one report, e.g. /reports/get_total_population?state=Kerala&limit=5
+#   GET /census                  returns the cleaned census data published by the publish stage (--source published)
+# Query parameters: state and district (repeatable) filter the rows, order_by names an output column, desc=1 sorts
+# largest first, limit caps the rows and format is records (default), columns (one array per column) or arrow
+# (an Arrow IPC stream). Responses are gzipped when the client accepts it.
+#
+# Each response carries an ETag derived from the version of the data it was computed from, and a request with a
+# matching If-None-Match gets 304 Not Modified. The data version is checked at most once per --version-ttl seconds
+# and the encoded payloads are cached per ETag, so frequent polling is answered without touching the database.
+# Requests are handled by a pool of --workers threads with a short queue; when both are full the server stops
+# accepting connections until a worker is free.
+
+# Import necessary libraries
+import argparse
+import decimal
+import gzip
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import census
+
+# Seconds a data version is trusted before the source is asked for it again
+VERSION_TTL = 5.0
+
+# Requests accepted beyond the busy workers; further connections wait in the listen backlog
+QUEUED_REQUESTS = 16
+
+# Number of encoded report payloads kept in memory; the least recently used payload is evicted first
+PAYLOAD_CACHE_SIZE = 256
+
+# Response formats and their content types
+FORMATS = {
+    'records': 'application/json',
+    'columns': 'application/json',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+# Report functions by name, in the order display_dataframes shows them
+REPORT_FUNCTIONS = {function.__name__: (title, function) for title, function in census.REPORTS}
+
+
+# Define a function to read the data version of MySQL from the checksums of the tables the reports read
+def get_mysql_version():
+    db_connection = census.connect_to_census_db()
+    try:
+        cursor = db_connection.cursor()
+        cursor.execute("CHECKSUM TABLE States, Districts, Census_Data, Household_Data, District_Metrics, State_Metrics")
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        db_connection.close()
+    return repr(rows)
+
+
+# Define a function to read the data version of MongoDB from the hash of the census collection
+def get_mongodb_version():
+    client = census.pymongo.MongoClient("mongodb://localhost:27017/")
+    try:
+        return client["census_db"].command('dbHash', collections=['census'])['md5']
+    finally:
+        client.close()
+
+
+# Define a function to read the data version of the published Arrow files from their sizes and modification times
+def get_published_version(directory):
+    # The publish stage replaces each file atomically, so a new file always has a new modification time
+    stats = [(name, os.stat(os.path.join(directory, name))) for name in sorted(os.listdir(directory))
+             if name.endswith('.arrow')]
+    return repr([(name, stat.st_mtime_ns, stat.st_size) for name, stat in stats])
+
+
+# Data version of a report source, read again only after the TTL has expired
+class DataVersion:
+    def __init__(self, source, directory, ttl=VERSION_TTL):
+        self.source = source
+        self.directory = directory
+        self.ttl = ttl
+        self._value = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if self.source == 'published':
+            return get_published_version(self.directory)
+        if self.source == 'mongodb':
+            return get_mongodb_version()
+        return get_mysql_version()
+
+    def get(self):
+        # One request refreshes the version while the others wait for it, instead of all asking the source
+        with self._lock:
+            if self._value is None or time.monotonic() - self._checked >= self.ttl:
+                self._value = hashlib.sha256(self._read().encode()).hexdigest()
+                self._checked = time.monotonic()
+            return self._value
+
+
+# Encoded report payloads keyed by ETag, holding the plain body and, once requested, the gzipped body
+class PayloadCache:
+    def __init__(self, size=PAYLOAD_CACHE_SIZE):
+        self.size = size
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        with self._lock:
+            payload = self._payloads.get(etag)
+            if payload is not None:
+                self._payloads.move_to_end(etag)
+            return payload
+
+    def put(self, etag, payload):
+        with self._lock:
+            self._payloads[etag] = payload
+            self._payloads.move_to_end(etag)
+            if len(self._payloads) > self.size:
+                self._payloads.popitem(last=False)
+
+
+# Define a function to convert a value from a report table to one JSON can represent
+def to_json_value(value):
+    # MySQL returns SUM and AVG as decimals
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    # Rates of districts without a denominator are NaN
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+# Define a function to encode a report table in the requested format
+def encode_table(table, response_format):
+    if response_format == 'arrow':
+        sink = census.pa.BufferOutputStream()
+        with census.pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    columns = {name: [to_json_value(value) for value in column.to_pylist()]
+               for name, column in zip(table.column_names, table.columns)}
+    if response_format == 'columns':
+        body = {'columns': columns, 'rows': table.num_rows}
+    else:
+        body = [dict(zip(columns, row)) for row in zip(*columns.values())]
+    return json.dumps(body, separators=(',', ':')).encode()
+
+
+# Define a function to run a report from the source the service was started with
+def run_named_report(name, source, directory, filters):
+    if source == 'published':
+        if name == 'census':
+            return census.load_published_census(directory)
+        return census.load_published_report(REPORT_FUNCTIONS[name][1], directory)
+
+    _, function = REPORT_FUNCTIONS[name]
+    if source == 'mongodb':
+        return census.run_mongodb_report(name, **filters)
+    return function(**filters)
+
+
+# Define a function to read the report filters and format from the query string, rejecting the filters the
+# source cannot apply before any conditional request is answered
+def parse_report_query(query, source):
+    params = parse_qs(query)
+
+    def single(key):
+        return params[key][-1] if key in params else None
+
+    limit = single('limit')
+    if limit is not None:
+        if not limit.isdigit():
+            raise ValueError(f"Invalid limit: {limit}")
+        limit = int(limit)
+
+    response_format = single('format') or 'records'
+    if response_format not in FORMATS:
+        raise ValueError(f"Invalid format: {response_format}")
+
+    filters = {
+        'states': params.get('state'),
+        'districts': params.get('district'),
+        'order_by': single('order_by'),
+        'descending': single('desc') in ('1', 'true'),
+        'limit': limit
+    }
+
+    # The published files hold the complete reports and cannot be filtered
+    if source == 'published' and any(value is not None and value is not False for value in filters.values()):
+        raise ValueError("The published reports cannot be filtered")
+
+    return filters, response_format
+
+
+# Request handler for the report endpoints
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/')
+
+        if path == '/reports':
+            body = json.dumps([{'name': name, 'title': title, 'url': f"/reports/{name}"}
+                               for name, (title, _) in REPORT_FUNCTIONS.items()]).encode()
+            self.send_body(200, body, 'application/json')
+            return
+
+        # The cleaned census data is only published as a file, so it is served from the published source only
+        if path == '/census':
+            if self.server.source != 'published':
+                self.send_error(404, 'The census data is served with --source published')
+                return
+            name = 'census'
+        else:
+            name = path[len('/reports/'):] if path.startswith('/reports/') else None
+            if name not in REPORT_FUNCTIONS:
+                self.send_error(404, 'Unknown report')
+                return
+
+        try:
+            filters, response_format = parse_report_query(url.query, self.server.source)
+            self.send_report(name, filters, response_format)
+        except ValueError as e:
+            self.send_error(400, str(e))
+        except Exception as e:
+            # The database is unavailable or the query failed; the client may retry
+            self.log_error("Report %s failed: %s", name, e)
+            self.send_error(503, 'Report unavailable')
+
+    def send_report(self, name, filters, response_format):
+        server = self.server
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+
+        # The ETag changes whenever the data, the report, its filters, the format or the encoding change
+        version = server.data_version.get()
+        key = repr((version, name, sorted(filters.items()), response_format))
+        etag = hashlib.sha256(key.encode()).hexdigest()[:32]
+        etag = f'"{etag}-gzip"' if use_gzip else f'"{etag}"'
+
+        # Answer a matching conditional GET without running or encoding the report
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            if etag in tags or '*' in tags:
+                self.send_response(304)
+                self.send_cache_headers(etag)
+                self.end_headers()
+                return
+
+        # Run and encode the report only on a cache miss
+        payload = server.payloads.get(etag)
+        if payload is None:
+            body = encode_table(run_named_report(name, server.source, server.directory, filters), response_format)
+            payload = gzip.compress(body) if use_gzip else body
+            server.payloads.put(etag, payload)
+
+        self.send_body(200, payload, FORMATS[response_format], etag, use_gzip)
+
+    def send_cache_headers(self, etag):
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+
+    def send_body(self, status, body, content_type, etag=None, use_gzip=False):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        if etag:
+            self.send_cache_headers(etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# HTTP server that handles requests on a fixed pool of worker threads
+class ReportServer(HTTPServer):
+    # Connections the operating system holds while the server stops accepting; beyond them clients are refused
+    request_queue_size = 64
+
+    def __init__(self, address, source='mysql', directory=None, workers=8, version_ttl=VERSION_TTL):
+        super().__init__(address, ReportRequestHandler)
+        self.source = source
+        self.directory = directory or census.PUBLISHED_DIR
+        self.data_version = DataVersion(source, self.directory, version_ttl)
+        self.payloads = PayloadCache()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        # The executor queues without limit, so the accept loop waits here once the workers and the queue are full
+        self.slots = threading.BoundedSemaphore(workers + QUEUED_REQUESTS)
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        try:
+            self.executor.submit(self.process_request_thread, request, client_address)
+        except RuntimeError:
+            # The executor has been shut down
+            self.slots.release()
+            self.shutdown_request(request)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+# Main function
+if __name__ == '__main__':
+    # Parse the command line options
+    parser = argparse.ArgumentParser(description='Local HTTP/JSON service for the census reports')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8502, help='port to listen on')
+    parser.add_argument('--source', choices=['mysql', 'mongodb', 'published'], default='mysql',
+                        help='where the reports are read from')
+    parser.add_argument('--published-dir', default=census.PUBLISHED_DIR,
+                        help='directory of the Arrow files written by the publish stage')
+    parser.add_argument('--workers', type=int, default=8, help='threads handling requests')
+    parser.add_argument('--version-ttl', type=float, default=VERSION_TTL,
+                        help='seconds between checks of the data version')
+    args = parser.parse_args()
+
+    # Read database credentials from a file
+    if args.source == 'mysql':
+        census.read_db_credentials('db_credentials.txt')
+
+    server = ReportServer((args.host, args.port), args.source, args.published_dir, args.workers, args.version_ttl)
+    print(f"Serving the census reports on http://{args.host}:{server.server_port}/reports")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,317 @@
+# Tests for the parts of the census pipeline that can be checked without MySQL or MongoDB
+#
+# Run with `python -m pytest`. The MySQL loader tests use an in-memory stand-in for mysql.connector.
+
+# Import necessary libraries
+import types
+
+import pytest
+
+import census
+
+pd = census.pd
+
+
+# Errors of the mysql.connector stand-in, with the same hierarchy as the real module
+class FakeError(Exception):
+    pass
+
+
+class FakeOperationalError(FakeError):
+    pass
+
+
+class FakeInterfaceError(FakeError):
+    pass
+
+
+class FakeProgrammingError(FakeError):
+    pass
+
+
+# In-memory tables and Load_Progress marks shared by the connections of one test
+class FakeDatabase:
+    def __init__(self):
+        self.rows = []
+        self.marks = {}
+
+
+# Cursor that understands the statements issued by upload_fact_table and load_batch
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.result = None
+
+    def execute(self, sql, params=()):
+        if sql.startswith('SELECT last_district_code'):
+            mark = self.connection.database.marks.get(params[0])
+            self.result = None if mark is None else (mark,)
+        elif sql.startswith('INSERT INTO Load_Progress'):
+            self.connection.pending_mark = params
+        elif sql.startswith('DELETE FROM Load_Progress'):
+            self.connection.database.marks.pop(params[0], None)
+        elif sql.startswith('DELETE FROM'):
+            self.connection.database.rows = []
+
+    def executemany(self, sql, rows):
+        self.connection.on_insert(rows)
+        self.connection.pending_rows = rows
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+# Connection with transactions over a FakeDatabase; on_insert and on_commit let a test inject failures
+class FakeConnection:
+    def __init__(self, database, on_insert=None, on_commit=None):
+        self.database = database
+        self.on_insert = on_insert or (lambda rows: None)
+        self.on_commit = on_commit or (lambda: None)
+        self.connected = True
+        self.pending_rows = []
+        self.pending_mark = None
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def start_transaction(self):
+        self.pending_rows, self.pending_mark = [], None
+
+    def commit(self):
+        self.database.rows += self.pending_rows
+        if self.pending_mark is not None:
+            table, mark = self.pending_mark
+            self.database.marks[table] = mark
+        self.pending_rows, self.pending_mark = [], None
+        self.on_commit()
+
+    def rollback(self):
+        self.pending_rows, self.pending_mark = [], None
+
+    def is_connected(self):
+        return self.connected
+
+    def reconnect(self):
+        self.connected = True
+
+    def close(self):
+        self.connected = False
+
+
+@pytest.fixture
+def fake_mysql(monkeypatch):
+    errors = types.SimpleNamespace(OperationalError=FakeOperationalError, InterfaceError=FakeInterfaceError,
+                                   ProgrammingError=FakeProgrammingError)
+    monkeypatch.setattr(census, 'mysql', types.SimpleNamespace(
+        connector=types.SimpleNamespace(Error=FakeError, errors=errors)))
+    monkeypatch.setattr(census.time, 'sleep', lambda seconds: None)
+    return FakeDatabase()
+
+
+# Define a function to build a small fact table of ten districts, given in reverse District_code order
+def make_fact_frame():
+    codes = list(range(10, 0, -1))
+    return pd.DataFrame({'District_code': codes, 'Population': [code * 10 for code in codes]})
+
+
+FACT_COLUMNS = [('Population', 'Population')]
+FACT_SQL = census.build_insert_sql('Census_Data', ['District_code', 'Population'])
+
+
+def test_load_batch_skips_a_batch_below_the_high_water_mark(fake_mysql):
+    fake_mysql.marks['Census_Data'] = 6
+    connection = FakeConnection(fake_mysql)
+
+    batch = pd.DataFrame({'District_code': [4, 5, 6], 'Population': [40, 50, 60]})
+    census.load_batch(connection, 'Census_Data', FACT_SQL, batch)
+
+    assert fake_mysql.rows == []
+    assert fake_mysql.marks['Census_Data'] == 6
+
+
+def test_load_batch_inserts_a_batch_above_the_high_water_mark(fake_mysql):
+    fake_mysql.marks['Census_Data'] = 3
+    connection = FakeConnection(fake_mysql)
+
+    batch = pd.DataFrame({'District_code': [4, 5, 6], 'Population': [40, 50, 60]})
+    census.load_batch(connection, 'Census_Data', FACT_SQL, batch)
+
+    assert fake_mysql.rows == [[4, 40], [5, 50], [6, 60]]
+    assert fake_mysql.marks['Census_Data'] == 6
+
+
+def test_upload_fact_table_does_not_duplicate_a_batch_whose_acknowledgement_was_lost(fake_mysql, monkeypatch):
+    commits = []
+
+    # The second batch commits, but the connection drops before the client hears about it
+    def on_commit():
+        commits.append(1)
+        if len(commits) == 3:
+            connection.connected = False
+            raise FakeOperationalError('Lost connection to MySQL server during query')
+
+    connection = FakeConnection(fake_mysql, on_commit=on_commit)
+    monkeypatch.setattr(census, 'connect_to_census_db', lambda: connection)
+
+    census.upload_fact_table(make_fact_frame(), 'Census_Data', FACT_COLUMNS, batch_size=3)
+
+    assert sorted(code for code, _ in fake_mysql.rows) == list(range(1, 11))
+    assert fake_mysql.marks['Census_Data'] == 10
+
+
+def test_upload_fact_table_resumes_after_an_interruption(fake_mysql, monkeypatch):
+    inserts = []
+
+    # The third batch fails with an error that is not retried, which stops the load
+    def on_insert(rows):
+        inserts.append(rows)
+        if len(inserts) == 3:
+            raise FakeProgrammingError('Table is read only')
+
+    monkeypatch.setattr(census, 'connect_to_census_db', lambda: FakeConnection(fake_mysql, on_insert=on_insert))
+    census.upload_fact_table(make_fact_frame(), 'Census_Data', FACT_COLUMNS, batch_size=3)
+
+    assert sorted(code for code, _ in fake_mysql.rows) == list(range(1, 7))
+    assert fake_mysql.marks['Census_Data'] == 6
+
+    # Resuming loads only the districts after the last committed batch
+    monkeypatch.setattr(census, 'connect_to_census_db', lambda: FakeConnection(fake_mysql))
+    census.upload_fact_table(make_fact_frame(), 'Census_Data', FACT_COLUMNS, resume=True, batch_size=3)
+
+    assert sorted(code for code, _ in fake_mysql.rows) == list(range(1, 11))
+    assert fake_mysql.marks['Census_Data'] == 10
+
+
+# Define a function to build a cleaned census frame of valid districts, with every loaded count set to 1 and the
+# totals equal to the sum of their parts
+def make_census_frame(districts):
+    columns = [column for _, column in census.CENSUS_DATA_COLUMNS + census.HOUSEHOLD_DATA_COLUMNS]
+    df = pd.DataFrame(1, index=range(len(districts)), columns=columns)
+    for total, parts in census.IDENTITY_CONSTRAINTS.values():
+        df[total] = df[parts].sum(axis=1)
+    df.insert(0, 'District_code', range(1, len(districts) + 1))
+    df.insert(1, 'District', [district for district, _ in districts])
+    df.insert(2, 'State/UT', [state for _, state in districts])
+    return df
+
+
+def test_validate_data_accepts_district_names_repeated_across_states():
+    df = make_census_frame([('Hamirpur', 'Uttar Pradesh'), ('Hamirpur', 'Himachal Pradesh')])
+
+    clean, rejects = census.validate_data(df)
+
+    assert len(clean) == 2
+    assert rejects.empty
+
+
+def test_validate_data_reason_codes():
+    df = make_census_frame([
+        ('Kupwara', 'Jammu and Kashmir'), ('Badgam', 'Jammu and Kashmir'), ('Leh', 'Ladakh'),
+        ('Kargil', 'Ladakh'), ('Kargil', 'Ladakh'), ('Punch', None), ('Rajouri', 'Jammu and Kashmir'),
+        ('Kathua', 'Jammu and Kashmir')
+    ])
+    df['Population'] = df['Population'].astype(object)
+    df.loc[1, 'Male'] = -1
+    df.loc[2, 'Population'] = 'many'
+    df.loc[6, 'District_code'] = 1
+    df.loc[7, 'Population'] = 5
+
+    clean, rejects = census.validate_data(df)
+
+    reasons = rejects['reject_reason'].to_dict()
+    assert 'NEGATIVE_VALUE' in reasons[1]
+    assert 'INVALID_TYPE' in reasons[2]
+    assert reasons[4] == 'DUPLICATE_DISTRICT'
+    assert reasons[5] == 'MISSING_STATE'
+    assert reasons[6] == 'DUPLICATE_DISTRICT_CODE'
+    assert reasons[7] == 'POPULATION_MISMATCH'
+    assert list(clean.index) == [0, 3]
+
+
+def test_validate_data_checks_the_keys_loaded_into_mysql():
+    df = make_census_frame([('Kupwara', 'Jammu and Kashmir'), ('Leh', 'Ladakh')])
+
+    _, rejects = census.validate_data(df, district_codes=[1], state_ids=['Jammu and Kashmir'])
+
+    assert rejects['reject_reason'].to_dict() == {1: 'UNKNOWN_DISTRICT_CODE;UNKNOWN_STATE_ID'}
+
+
+def test_reconciliation_pinpoints_a_value_swapped_between_districts():
+    df = make_census_frame([('Kupwara', 'Jammu and Kashmir'), ('Badgam', 'Jammu and Kashmir'), ('Leh', 'Ladakh')])
+    df['Literate_Male'] = [10, 20, 30]
+    df['Literate'] = df['Literate_Male'] + df['Literate_Female']
+
+    # Swapping a value between two districts of the same state keeps every state sum the same
+    swapped = df.copy()
+    swapped.loc[[0, 1], 'Literate_Male'] = [20, 10]
+
+    states = census.compare_summaries(census.summarize_dataframe(df), census.summarize_dataframe(swapped), 'mysql')
+    assert states[['table', 'key', 'field']].values.tolist() == [['Census_Data', 'Jammu and Kashmir', 'digest']]
+
+    districts = census.compare_summaries(census.summarize_dataframe(df, 'District_code', ['Jammu and Kashmir']),
+                                         census.summarize_dataframe(swapped, 'District_code', ['Jammu and Kashmir']),
+                                         'mysql')
+    differences = districts[districts['field'] != 'digest']
+    assert differences[['key', 'field', 'expected', 'actual']].values.tolist() == [
+        [1, 'Literate_Male', 10, 20], [2, 'Literate_Male', 20, 10]
+    ]
+
+
+def test_reconciliation_reports_a_missing_state_once():
+    df = make_census_frame([('Kupwara', 'Jammu and Kashmir'), ('North Goa', 'Goa')])
+
+    differences = census.compare_summaries(census.summarize_dataframe(df),
+                                           census.summarize_dataframe(df[df['State/UT'] != 'Goa']), 'mongodb')
+
+    assert differences[['table', 'key', 'field']].values.tolist() == [
+        ['Census_Data', 'Goa', 'row_count'], ['Household_Data', 'Goa', 'row_count']
+    ]
+
+
+def test_build_mongodb_pipeline_for_a_state_report():
+    pipeline = census.build_mongodb_pipeline('State/UT', {
+        'total_households': ('sum', 'Households'),
+        'literacy_rate': ('percentage', ['Literate_Education'], 'Population')
+    })
+
+    assert pipeline == [
+        {'$group': {
+            '_id': '$State/UT',
+            'total_households': {'$sum': {'$ifNull': ['$Households', 0]}},
+            'literacy_rate_numerator': {'$sum': {'$add': [{'$ifNull': ['$Literate_Education', 0]}]}},
+            'literacy_rate_denominator': {'$sum': {'$ifNull': ['$Population', 0]}}
+        }},
+        {'$sort': {'_id': 1}},
+        {'$project': {
+            '_id': 0,
+            'State_or_UT': '$_id',
+            'total_households': 1,
+            'literacy_rate': {'$cond': [
+                {'$eq': ['$literacy_rate_denominator', 0]},
+                None,
+                {'$multiply': [{'$divide': ['$literacy_rate_numerator', '$literacy_rate_denominator']}, 100]}
+            ]}
+        }}
+    ]
+
+
+def test_build_mongodb_pipeline_groups_districts_by_code_and_applies_the_filters():
+    pipeline = census.build_mongodb_pipeline('District', {'worker_percentage': ('value', 'worker_percentage')},
+                                             states=['Kerala'], order_by='worker_percentage', descending=True,
+                                             limit=5)
+
+    assert pipeline == [
+        {'$match': {'State/UT': {'$in': ['Kerala']}}},
+        {'$group': {
+            '_id': '$District_code',
+            'District': {'$first': '$District'},
+            'worker_percentage': {'$first': '$worker_percentage'}
+        }},
+        {'$sort': {'District': 1, '_id': 1}},
+        {'$project': {'_id': 0, 'district': '$District', 'worker_percentage': 1}},
+        {'$sort': {'worker_percentage': -1}},
+        {'$limit': 5}
+    ]